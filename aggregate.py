@@ -0,0 +1,263 @@
+import json
+from collections.abc import Iterable, Mapping
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from export_sink import Export_sink
+from log import logger
+from metrics import metrics
+from pool import run_in_pool
+from ranking import rank_candidates
+from service_template import Form_handler
+from settings import DEFAULT_RANKING_STRATEGIES
+from utils import INFO_COLUMNS, compact_responses_df, get_score_columns
+
+# the columns telling which form, and so which category, a response of the
+# consolidated dataframe comes from
+TAG_COLUMNS = ["formId", "category"]
+# the form_type the consolidated exports are saved under
+CONSOLIDATED_NAME = "all"
+
+
+def concat_responses_dfs(
+    responses_dfs: Mapping[str, tuple[str, pd.DataFrame]],
+) -> pd.DataFrame:
+    """
+    concatenates the responses dataframes of several forms, given as
+    {formId: (category, responses_df)}, once into a dataframe starting with
+    categorical formId and category columns. The score columns are the
+    criteria of all the forms, a criterion a form does not ask is NaN in the
+    rows of that form
+
+    formId | category | Judge Name | Affiliation | candidate | Question 1 | ...
+    ---------------------------------------------------------------------------
+    form1  | Award 1  | Judge 1    | CAA         | candidate1| answer1    | ...
+    form2  | Award 2  | Judge 1    | CAA         | candidate3| answer1    | ...
+
+    input: responses_dfs
+    output: pd.DataFrame
+    """
+    tagged_dfs = {
+        formId: (category, responses_df)
+        for formId, (category, responses_df) in responses_dfs.items()
+        if not responses_df.empty
+    }
+    if not tagged_dfs:
+        return pd.DataFrame(columns=[*TAG_COLUMNS, *INFO_COLUMNS])
+    lengths = [len(responses_df) for _, responses_df in tagged_dfs.values()]
+    consolidated_df = compact_responses_df(
+        pd.concat(
+            [responses_df for _, responses_df in tagged_dfs.values()],
+            ignore_index=True,
+        )
+    )
+    # the tags are built from their codes, one run of rows per form
+    consolidated_df.insert(
+        0,
+        "formId",
+        pd.Categorical.from_codes(
+            np.repeat(np.arange(len(tagged_dfs)), lengths), categories=list(tagged_dfs)
+        ),
+    )
+    consolidated_df.insert(
+        1,
+        "category",
+        pd.Categorical(
+            np.repeat(
+                np.array([category for category, _ in tagged_dfs.values()], object),
+                lengths,
+            )
+        ),
+    )
+    return consolidated_df
+
+
+def get_judge_workload(
+    consolidated_df: pd.DataFrame, forms_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    returns the number of candidates each judge of each form scored, with
+    the expected and answered scores and the completion rate, from a single
+    groupby over the consolidated responses. forms_df is indexed by formId
+    with the number of candidates and criteria of each form, the candidates
+    a judge did not score at all count as expected scores too
+
+    formId | category | judge   | candidates | answered | expected | completion_rate
+    ---------------------------------------------------------------------------------
+    form1  | Award 1  | Judge 1 | 10         | 48       | 50       | 0.96
+    """
+    columns = [*TAG_COLUMNS, "judge", "candidates", "answered", "expected"]
+    if consolidated_df.empty:
+        return pd.DataFrame(columns=[*columns, "completion_rate"])
+    score_columns = get_score_columns(consolidated_df)
+    # a judge who sent the form twice is counted once, with the last answers
+    latest = ~consolidated_df.duplicated(
+        ["formId", "Judge Name", "candidate"], keep="last"
+    )
+    rows = consolidated_df.loc[latest, [*TAG_COLUMNS, "Judge Name"]].assign(
+        answered=consolidated_df.loc[latest, score_columns].notna().sum(axis=1)
+    )
+    workload = (
+        rows.groupby([*TAG_COLUMNS, "Judge Name"], observed=True)
+        .agg(candidates=("answered", "size"), answered=("answered", "sum"))
+        .reset_index()
+        .rename(columns={"Judge Name": "judge"})
+    )
+    expected_per_judge = forms_df["candidates"] * forms_df["criteria"]
+    workload["expected"] = (
+        workload["formId"].astype(str).map(expected_per_judge).astype("int64")
+    )
+    workload["completion_rate"] = (workload["answered"] / workload["expected"]).where(
+        workload["expected"] > 0
+    )
+    return workload
+
+
+def get_category_completion(workload: pd.DataFrame) -> pd.DataFrame:
+    """
+    returns the number of judges and the expected and answered scores of
+    each form and category from the workload of its judges
+
+    formId | category | judges | answered | expected | completion_rate
+    """
+    completion = (
+        workload.groupby(TAG_COLUMNS, observed=True)
+        .agg(
+            judges=("judge", "size"),
+            answered=("answered", "sum"),
+            expected=("expected", "sum"),
+        )
+        .reset_index()
+    )
+    completion["completion_rate"] = (
+        completion["answered"] / completion["expected"]
+    ).where(completion["expected"] > 0)
+    return completion
+
+
+def _to_records(df: pd.DataFrame) -> list:
+    # through to_json, which writes the missing values as null
+    return json.loads(df.to_json(orient="records"))
+
+
+def build_consolidated_report(
+    consolidated_df: pd.DataFrame,
+    forms_df: pd.DataFrame,
+    strategies: Iterable[str] = DEFAULT_RANKING_STRATEGIES,
+) -> dict:
+    """
+    returns the ranking of the candidates of every category, the workload of
+    every judge and the completion of every category, each computed in one
+    pass over the consolidated responses, as a dict that can be saved as json
+
+    input: consolidated_df, see concat_responses_dfs(), forms_df, see
+        get_judge_workload(), strategies
+    output: dict
+    """
+    with metrics.stage("ranking"):
+        ranking = rank_candidates(consolidated_df, strategies, TAG_COLUMNS)
+    with metrics.stage("audit"):
+        workload = get_judge_workload(consolidated_df, forms_df)
+        completion = get_category_completion(workload)
+    answered = int(workload["answered"].sum())
+    expected = int(workload["expected"].sum())
+    return {
+        "forms": _to_records(forms_df.reset_index()),
+        "responses": len(consolidated_df),
+        "expected": expected,
+        "answered": answered,
+        "completion_rate": answered / expected if expected else None,
+        "completion": _to_records(completion),
+        "workload": _to_records(workload),
+        "ranking": _to_records(ranking),
+    }
+
+
+def collect_responses_dfs(
+    forms_ids: list, workers: int = 1, handler_kwargs: Optional[dict] = None
+) -> tuple[dict, dict]:
+    """
+    fetches the forms in batch calls, see Form_handler.from_form_ids(), then
+    the responses dataframe of each form on a pool of worker threads, see
+    pool.run_in_pool(), and returns ({formId: (category, responses_df,
+    candidates, criteria)}, {formId: exception}), the category of a form is
+    its title
+
+    input: forms_ids, workers, handler_kwargs, passed to every Form_handler
+    output: tuple[dict, dict]
+    """
+    handlers = Form_handler.from_form_ids(forms_ids, **(handler_kwargs or {}))
+
+    def collect(formId: str) -> tuple[str, pd.DataFrame, int, int]:
+        handler = handlers[formId]
+        responses_df = handler.get_responses_df()
+        schema = handler.schema
+        return (
+            handler.form_type,
+            responses_df,
+            len(schema.candidates),
+            len(schema.score_columns),
+        )
+
+    return run_in_pool(forms_ids, collect, workers, "form with id")
+
+
+def export_consolidated(
+    forms_ids: list, workers: int = 1, handler_kwargs: Optional[dict] = None
+) -> dict:
+    """
+    fetches every form once, concatenates their responses into a single
+    dataframe and writes it with the consolidated report of all the
+    categories, see build_consolidated_report(), instead of a file per form.
+    The forms that failed are left out, returns {formId: exception} for them
+
+    input: forms_ids, workers, handler_kwargs, the sink and ranking
+        strategies are taken from them
+    output: dict
+    """
+    handler_kwargs = handler_kwargs or {}
+    collected, errors = collect_responses_dfs(forms_ids, workers, handler_kwargs)
+    # in the order of forms_ids rather than the order the workers finished in
+    forms = {formId: collected[formId] for formId in forms_ids if formId in collected}
+    forms_df = pd.DataFrame.from_dict(
+        {
+            formId: {
+                "category": category,
+                "responses": len(responses_df),
+                "candidates": candidates,
+                "criteria": criteria,
+            }
+            for formId, (category, responses_df, candidates, criteria) in forms.items()
+        },
+        orient="index",
+        columns=["category", "responses", "candidates", "criteria"],
+    ).rename_axis("formId")
+    with metrics.stage("consolidate"):
+        consolidated_df = concat_responses_dfs(
+            {
+                formId: (category, responses_df)
+                for formId, (category, responses_df, _, _) in forms.items()
+            }
+        )
+    # the dataframes of the forms are no longer needed
+    del collected, forms
+    memory_usage = int(consolidated_df.memory_usage(deep=True).sum())
+    metrics.record_dataframe_bytes(CONSOLIDATED_NAME, memory_usage)
+    logger.info(
+        f"consolidated [{len(consolidated_df)}] responses of [{len(forms_df)}] "
+        f"forms taking [{memory_usage}] bytes"
+    )
+    report = build_consolidated_report(
+        consolidated_df,
+        forms_df,
+        handler_kwargs.get("ranking_strategies") or DEFAULT_RANKING_STRATEGIES,
+    )
+    sink = handler_kwargs.get("sink") or Export_sink()
+    with metrics.stage("write_responses"):
+        sink.save(consolidated_df, "responses", CONSOLIDATED_NAME)
+    with metrics.stage("write_consolidated"):
+        path = sink.save_json(report, "consolidated", CONSOLIDATED_NAME)
+    logger.info(f"saved the consolidated report of [{len(forms_df)}] forms to [{path}]")
+    return errors
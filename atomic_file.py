@@ -0,0 +1,44 @@
+import json
+import os
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+
+@contextmanager
+def replacing(path: Path) -> Iterator[Path]:
+    """
+    yields a temporary path of its own next to path, which the block writes
+    to and which is then moved to path, or removed if the block fails. Readers
+    never see a partial file, and threads or processes writing path at once
+    never replace it with one
+
+    input: path
+    output: Iterator[Path]
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    except BaseException:
+        temporary_path.unlink(missing_ok=True)
+        raise
+
+
+def write_text(path: Path, text: str) -> Path:
+    """
+    replaces path with a file holding text, see replacing()
+    """
+    with replacing(path) as temporary_path:
+        temporary_path.write_text(text)
+    return path
+
+
+def write_json(path: Path, data: Any, indent: Optional[int] = None) -> Path:
+    """
+    replaces path with a file holding data as json, see replacing()
+    """
+    return write_text(path, json.dumps(data, indent=indent))
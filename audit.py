@@ -0,0 +1,73 @@
+from collections.abc import Iterable
+from typing import Optional
+
+import pandas as pd
+
+from utils import get_score_columns
+
+
+def get_missing_matrix(
+    responses_df: pd.DataFrame, candidates: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    returns a boolean dataframe indexed by (judge, candidate) with a column
+    per criterion that is True where the score is missing. Every judge gets a
+    row for every candidate, so candidates a judge did not score at all are
+    reported too. candidates defaults to the candidates in responses_df
+    """
+    score_columns = get_score_columns(responses_df)
+    scores = responses_df.set_index(["Judge Name", "candidate"])[score_columns]
+    scores.index.names = ["judge", "candidate"]
+    # a judge who sent the form twice is counted once, with the last answers
+    scores = scores[~scores.index.duplicated(keep="last")]
+    if candidates is None:
+        candidates = scores.index.get_level_values("candidate").unique()
+    full_index = pd.MultiIndex.from_product(
+        [scores.index.get_level_values("judge").unique(), list(candidates)],
+        names=["judge", "candidate"],
+    )
+    return scores.reindex(full_index).isna()
+
+
+def get_missing_scores(missing_matrix: pd.DataFrame) -> pd.DataFrame:
+    """
+    returns one row per missing score with the columns judge, candidate and
+    criterion
+    """
+    missing = missing_matrix.stack()
+    missing.index.names = ["judge", "candidate", "criterion"]
+    return missing[missing].index.to_frame(index=False)
+
+
+def get_completion_rates(missing_matrix: pd.DataFrame, by: str) -> pd.DataFrame:
+    """
+    returns the number of expected and answered scores and the completion
+    rate for each judge or candidate, by is "judge" or "candidate"
+    """
+    expected = (
+        missing_matrix.groupby(level=by, observed=True).size() * missing_matrix.shape[1]
+    )
+    answered = (~missing_matrix).groupby(level=by, observed=True).sum().sum(axis=1)
+    completion = pd.DataFrame({"expected": expected, "answered": answered})
+    completion["completion_rate"] = completion["answered"] / completion["expected"]
+    return completion.sort_values("completion_rate").reset_index()
+
+
+def build_missing_scores_report(missing_matrix: pd.DataFrame) -> dict:
+    """
+    returns the audit as a dict that can be saved as json
+    """
+    expected = int(missing_matrix.size)
+    missing = int(missing_matrix.to_numpy().sum())
+    return {
+        "expected": expected,
+        "answered": expected - missing,
+        "completion_rate": (expected - missing) / expected if expected else None,
+        "per_judge": get_completion_rates(missing_matrix, "judge").to_dict(
+            orient="records"
+        ),
+        "per_candidate": get_completion_rates(missing_matrix, "candidate").to_dict(
+            orient="records"
+        ),
+        "missing": get_missing_scores(missing_matrix).to_dict(orient="records"),
+    }
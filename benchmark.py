@@ -0,0 +1,261 @@
+"""
+end to end benchmark of the exports against the in memory fake_google
+backend, no credentials or network needed. Reports the wall time, the api
+calls by endpoint and the peak memory of every action, and the cold start
+of the command line, and compares them to a previous --output file given as
+--baseline
+
+python benchmark.py --forms 20 --judges 30 --candidates 15 --output bench.json
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Any, Callable
+
+ACTIONS = ["export_all_candidates", "export_ranking", "export_all"]
+# commands timed from a new interpreter, as a user starting the tool would
+STARTUP_COMMANDS = {
+    "main --help": [sys.executable, "main.py", "--help"],
+    "import main": [sys.executable, "-c", "import main"],
+}
+_RATE_SETTINGS = [
+    "FORMS_REQUESTS_PER_MINUTE",
+    "DRIVE_REQUESTS_PER_MINUTE",
+    "SHEETS_REQUESTS_PER_MINUTE",
+    "DOCS_REQUESTS_PER_MINUTE",
+]
+
+
+def parse_args() -> Namespace:
+    Parser = ArgumentParser(description="benchmark the exports on fake data")
+    Parser.add_argument("--forms", type=int, default=10)
+    Parser.add_argument("--judges", type=int, default=20)
+    Parser.add_argument("--candidates", type=int, default=10)
+    Parser.add_argument("-w", "--workers", type=int, default=4)
+    Parser.add_argument("-r", "--repeat", type=int, default=3)
+    Parser.add_argument(
+        "-a", "--actions", nargs="+", choices=ACTIONS, default=ACTIONS[:2]
+    )
+    Parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per http round trip"
+    )
+    Parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of requests given a 429"
+    )
+    Parser.add_argument(
+        "--rate-limited",
+        action="store_true",
+        help="keep the per minute quotas of the settings, off by default",
+    )
+    Parser.add_argument(
+        "--skip-startup",
+        action="store_true",
+        help="do not time the cold start of main.py",
+    )
+    Parser.add_argument("-o", "--output", type=Path, help="write the results as json")
+    Parser.add_argument("--baseline", type=Path, help="results json to compare to")
+    Parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slow down against the baseline, 0.25 is 25%%",
+    )
+    return Parser.parse_args()
+
+
+def measure(run: Callable[[], Any], repeat: int) -> dict:
+    """
+    runs run repeat times for the timings and once more under tracemalloc for
+    the peak memory, which slows it down too much to time it
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": statistics.median(seconds),
+        "runs": seconds,
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def measure_startup(repeat: int, environment: dict) -> dict:
+    """
+    returns the median wall time of each of the STARTUP_COMMANDS run in a new
+    process, the interpreter start included
+    """
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                command,
+                cwd=Path(__file__).parent,
+                env=environment,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            seconds.append(time.perf_counter() - start)
+        results[name] = {"seconds": statistics.median(seconds), "runs": seconds}
+    return results
+
+
+def run_benchmark(args: Namespace, work_directory: Path) -> dict:
+    # the settings are read on import, so they are set before importing the
+    # modules of the project
+    for name in ["CACHE_DIRECTORY_PATH", "OUTPUT_DIRECTORY_PATH"]:
+        os.environ[name] = str(work_directory / name.lower())
+    os.environ["DATA_DIRECTORY_PATH"] = str(work_directory)
+    if not args.rate_limited:
+        for name in _RATE_SETTINGS:
+            os.environ[name] = "1e9"
+
+    from log import configure_logging
+
+    configure_logging(work_directory / "logs")
+
+    from export_sink import Export_sink
+    from fake_google import Fake_google
+    from main import (
+        export_all,
+        export_all_forms_to_csv,
+        export_ranking_to_csv,
+        get_forms_ids,
+    )
+    from service_template import EXPORT_STAGES, client_registry
+
+    fake = Fake_google.with_forms(
+        args.forms,
+        args.judges,
+        args.candidates,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    client_registry.use_http(fake.http)
+    handler_kwargs = {"sink": Export_sink(work_directory / "exports")}
+    actions: dict[str, Callable[[list], dict]] = {
+        "export_all_candidates": lambda forms_ids: export_all_forms_to_csv(
+            forms_ids, args.workers, **handler_kwargs
+        ),
+        "export_ranking": lambda forms_ids: export_ranking_to_csv(
+            forms_ids, args.workers, **handler_kwargs
+        ),
+        "export_all": lambda forms_ids: export_all(
+            forms_ids, list(EXPORT_STAGES), args.workers, **handler_kwargs
+        ),
+    }
+
+    results = {}
+    for action in args.actions:
+
+        def run() -> None:
+            # a run starts from new services like a new process would
+            client_registry.clear()
+            errors = actions[action](get_forms_ids({}))
+            if errors:
+                raise RuntimeError(f"[{len(errors)}] forms failed in [{action}]")
+
+        fake.reset_calls()
+        result = measure(run, args.repeat)
+        calls = fake.reset_calls()
+        runs = args.repeat + 1
+        # a batch call is one round trip, its requests are counted separately
+        result["http_round_trips"] = calls.pop("http", 0) / runs
+        result["api_calls"] = {
+            endpoint: count / runs for endpoint, count in sorted(calls.items())
+        }
+        result["responses_per_second"] = args.forms * args.judges / result["seconds"]
+        results[action] = result
+    client_registry.use_http(None)
+    if not args.skip_startup:
+        results["startup"] = measure_startup(args.repeat, dict(os.environ))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    returns a message per action slower than the baseline by more than
+    tolerance, or making more api calls than it
+    """
+    regressions = []
+    for name, result in results.get("startup", {}).items():
+        before = baseline.get("startup", {}).get(name)
+        if before and result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"[{name}] took [{result['seconds']:.3f}]s, "
+                f"[{before['seconds']:.3f}]s in the baseline"
+            )
+    for action, result in results.items():
+        if action == "startup" or action not in baseline:
+            continue
+        before = baseline[action]
+        if result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"[{action}] took [{result['seconds']:.3f}]s, "
+                f"[{before['seconds']:.3f}]s in the baseline"
+            )
+        if result["http_round_trips"] > before.get("http_round_trips", 0):
+            regressions.append(
+                f"[{action}] made [{result['http_round_trips']:.0f}] http calls, "
+                f"[{before.get('http_round_trips', 0):.0f}] in the baseline"
+            )
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    for action, result in results.items():
+        if action == "startup":
+            for name, startup in result.items():
+                print(f"{name}: {startup['seconds']:.3f}s median")
+            continue
+        print(
+            f"{action}: {result['seconds']:.3f}s median, "
+            f"{result['responses_per_second']:.0f} responses/s, "
+            f"{result['http_round_trips']:.0f} http calls, "
+            f"{result['peak_memory_mb']:.1f} MB peak"
+        )
+        for endpoint, count in result["api_calls"].items():
+            print(f"    {endpoint}: {count:.0f}")
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as work_directory:
+        results = run_benchmark(args, Path(work_directory))
+    print_results(results)
+    if args.output:
+        config = {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        }
+        args.output.write_text(
+            json.dumps({"config": config, "results": results}, indent=2)
+        )
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,53 @@
+import threading
+
+from google.auth.transport import Request
 from google.oauth2 import service_account
 
+_SCOPES = [
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/forms",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/documents",
+]
+
+_shared_credentials: service_account.Credentials | None = None
+_shared_credentials_lock = threading.Lock()
+
+
+class Thread_safe_credentials(service_account.Credentials):
+    """
+    Service account credentials that only let one thread refresh the token
+    at a time, the other threads reuse the token once it is refreshed
+    """
+
+    _refresh_lock = threading.Lock()
+
+    def refresh(self, request: Request) -> None:
+        with self._refresh_lock:
+            if self.valid:
+                return
+            super().refresh(request)
+
 
 def get_credentials() -> service_account.Credentials:
     """
     Returns credentials for Google API
     """
 
-    credentials = service_account.Credentials.from_service_account_file(
+    credentials = Thread_safe_credentials.from_service_account_file(
         "token.json",
-        scopes=[
-            "https://www.googleapis.com/auth/drive",
-            "https://www.googleapis.com/auth/forms",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/documents",
-        ],
+        scopes=_SCOPES,
     )
     return credentials
+
+
+def get_shared_credentials() -> service_account.Credentials:
+    """
+    Returns the credentials shared by the whole process, token.json is read
+    on the first call only
+    """
+    global _shared_credentials
+    with _shared_credentials_lock:
+        if _shared_credentials is None:
+            _shared_credentials = get_credentials()
+        return _shared_credentials
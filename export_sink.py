@@ -0,0 +1,222 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from atomic_file import replacing, write_json
+from log import logger
+from settings import EXPORT_COMPRESSION, EXPORT_FORMAT, OUTPUT_DIRECTORY_PATH
+
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+# compressed csv files get the extension pandas infers the compression from,
+# zstd is left out as pandas needs the zstandard package for it
+CSV_COMPRESSION_EXTENSIONS = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz"}
+# the compressions each format can be written with, parquet and feather
+# files are compressed by pyarrow, which only knows these codecs for them
+COMPRESSIONS = {
+    "csv": list(CSV_COMPRESSION_EXTENSIONS),
+    "parquet": ["snappy", "gzip", "brotli", "lz4", "zstd", "none"],
+    "feather": ["lz4", "zstd", "uncompressed"],
+}
+
+
+def _point_latest_to(path: Path, latest_path: Path) -> None:
+    """
+    points latest_path to path with a relative symlink, or with a copy where
+    symlinks are not available, swapping it in atomically
+    """
+    with replacing(latest_path) as temporary_path:
+        try:
+            temporary_path.symlink_to(path.name)
+        except OSError:
+            shutil.copyfile(path, temporary_path)
+
+
+def _with_string_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    returns df with string categories in all its categorical columns. The
+    categories of a column without any value in a chunk, an optional text
+    question no judge answered yet, are floats, which no later chunk with
+    answers could be written or concatenated with
+    """
+    columns = [
+        column
+        for column, values in df.items()
+        if isinstance(values.dtype, pd.CategoricalDtype)
+        and not pd.api.types.is_string_dtype(values.cat.categories)
+    ]
+    if not columns:
+        return df
+    df = df.copy(deep=False)
+    for column in columns:
+        df[column] = df[column].cat.rename_categories(
+            df[column].cat.categories.astype(str)
+        )
+    return df
+
+
+def _concat_chunks(chunks: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    concatenates chunks keeping their categorical columns categorical, with
+    the union of the categories of the chunks. pd.concat alone turns the
+    categoricals of chunks with different categories into object columns
+    """
+    chunks = [_with_string_categories(chunk) for chunk in chunks]
+    dtypes = {}
+    for column in chunks[0].columns:
+        columns = [chunk[column] for chunk in chunks if column in chunk]
+        if all(isinstance(values.dtype, pd.CategoricalDtype) for values in columns):
+            dtypes[column] = pd.CategoricalDtype(union_categoricals(columns).categories)
+    return pd.concat(
+        [
+            chunk.astype(
+                {column: dtypes[column] for column in chunk if column in dtypes}
+            )
+            for chunk in chunks
+        ]
+    )
+
+
+class Dataframe_writer:
+    """
+    writes a dataframe in one or more chunks to a temporary file that is
+    renamed to its final name by commit(), so readers never see a partial
+    file. Use Export_sink.open() to create one
+    """
+
+    def __init__(
+        self, path: Path, latest_path: Path, format: str, compression: Optional[str]
+    ) -> None:
+        self.path = path
+        self.latest_path = latest_path
+        self.format = format
+        self.compression = compression or None
+        self.temporary_path = path.with_name(path.name + ".tmp")
+        self._chunks: list[pd.DataFrame] = []
+        self._parquet_writer: Any = None
+        self._number_of_rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.format == "csv":
+            df.to_csv(
+                self.temporary_path,
+                mode="a" if self._number_of_rows else "w",
+                header=not self._number_of_rows,
+                compression=self.compression,
+            )
+        elif self.format == "parquet":
+            # imported here so pyarrow is only needed for parquet exports
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            df = _with_string_categories(df)
+            if self._parquet_writer is None:
+                # the file takes the schema of the first chunk, with int32
+                # dictionary indices for the categorical columns as pandas
+                # picks int8 codes for the few categories of a first chunk
+                schema = pa.Schema.from_pandas(df)
+                for index, field in enumerate(schema):
+                    if pa.types.is_dictionary(field.type):
+                        schema = schema.set(
+                            index,
+                            field.with_type(pa.dictionary(pa.int32(), pa.string())),
+                        )
+                self._parquet_writer = pq.ParquetWriter(
+                    self.temporary_path,
+                    schema,
+                    compression=self.compression or "snappy",
+                )
+            table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            # feather files can not be appended to, they are written on commit
+            self._chunks.append(df)
+        self._number_of_rows += len(df)
+
+    def commit(self) -> Path:
+        if self.format == "feather":
+            df = _concat_chunks(self._chunks) if self._chunks else pd.DataFrame()
+            # feather only stores a default index, keep the index as a column
+            df.reset_index().to_feather(
+                self.temporary_path, compression=self.compression
+            )
+        elif self._parquet_writer is not None:
+            self._parquet_writer.close()
+        elif not self.temporary_path.exists():
+            # nothing was written, save an empty file
+            self.write(pd.DataFrame())
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        os.replace(self.temporary_path, self.path)
+        _point_latest_to(self.path, self.latest_path)
+        logger.info(f"saved [{self._number_of_rows}] rows to [{self.path}]")
+        return self.path
+
+    def abort(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        self.temporary_path.unlink(missing_ok=True)
+
+
+class Export_sink:
+    """
+    where and how the exports of the forms are written. Each export is saved
+    as [df_type]_[date]_[form_type][extension] in output_directory, and
+    [df_type]_[form_type]_latest[extension] always points to the last one
+    """
+
+    def __init__(
+        self,
+        output_directory: Path = OUTPUT_DIRECTORY_PATH,
+        format: str = EXPORT_FORMAT,
+        compression: Optional[str] = EXPORT_COMPRESSION,
+    ) -> None:
+        if format not in EXTENSIONS:
+            raise ValueError(
+                f"unknown export format [{format}], choose from {list(EXTENSIONS)}"
+            )
+        # checked here rather than when the export is written, after all the
+        # responses are fetched
+        if compression and compression not in COMPRESSIONS[format]:
+            raise ValueError(
+                f"unknown {format} compression [{compression}], choose from "
+                f"{COMPRESSIONS[format]}"
+            )
+        self.output_directory = Path(output_directory)
+        self.format = format
+        self.compression = compression or None
+
+    def _get_paths(self, df_type: str, form_type: str, extension: str) -> tuple:
+        form_name = str(form_type).replace(os.sep, "_").replace("/", "_")
+        current_time = str(datetime.now().isoformat()).replace(":", "_")
+        self.output_directory.mkdir(parents=True, exist_ok=True)
+        return (
+            self.output_directory / f"{df_type}_{current_time}_{form_name}{extension}",
+            self.output_directory / f"{df_type}_{form_name}_latest{extension}",
+        )
+
+    def open(self, df_type: str, form_type: str) -> Dataframe_writer:
+        extension = EXTENSIONS[self.format]
+        if self.format == "csv" and self.compression:
+            extension += CSV_COMPRESSION_EXTENSIONS.get(self.compression, "")
+        path, latest_path = self._get_paths(df_type, form_type, extension)
+        return Dataframe_writer(path, latest_path, self.format, self.compression)
+
+    def save(self, df: pd.DataFrame, df_type: str, form_type: str) -> Path:
+        writer = self.open(df_type, form_type)
+        try:
+            writer.write(df)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def save_json(self, data: dict, df_type: str, form_type: str) -> Path:
+        path, latest_path = self._get_paths(df_type, form_type, ".json")
+        write_json(path, data, indent=2)
+        _point_latest_to(path, latest_path)
+        return path
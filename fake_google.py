@@ -0,0 +1,623 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+
+from response_store import to_datetime
+
+FORM_MIME_TYPE = "application/vnd.google-apps.form"
+DEFAULT_CRITERIA = ["Impact", "Innovation", "Leadership", "Sustainability"]
+AFFILIATIONS = ["Secretariat", "FCDO", "CAA"]
+
+_FORMS_PATH = re.compile(r"^/v1/forms(?:/(?P<formId>[^/:]+))?(?P<rest>.*)$")
+_DRIVE_PATH = re.compile(r"^/drive/v3/files(?:/(?P<fileId>[^/]+))?$")
+_DRIVE_CHANGES_PATH = re.compile(r"^/drive/v3/changes(?P<start>/startPageToken)?$")
+_SHEETS_PATH = re.compile(
+    r"^/v4/spreadsheets/(?P<spreadsheetId>[^/]+)"
+    r"(?:/values/(?P<range>.+)|/values:(?P<batchGet>batchGet))?$"
+)
+_DOCS_PATH = re.compile(r"^/v1/documents/(?P<documentId>[^/]+)$")
+_QUERY_CONDITIONS = {
+    "name_prefix": re.compile(r"name contains '((?:[^'\\]|\\.)*)'"),
+    "folderId": re.compile(r"'((?:[^'\\]|\\.)*)' in parents"),
+    "owner": re.compile(r"'((?:[^'\\]|\\.)*)' in owners"),
+    "modified_after": re.compile(r"modifiedTime > '((?:[^'\\]|\\.)*)'"),
+}
+
+
+def _unquote_query_value(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class Fake_error(Exception):
+    def __init__(self, status: int, message: str, reason: str = "") -> None:
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+    def to_content(self) -> dict:
+        error: dict = {"code": self.status, "message": str(self)}
+        if self.reason:
+            error["errors"] = [{"reason": self.reason, "message": str(self)}]
+        return {"error": error}
+
+
+def generate_form(
+    formId: str,
+    title: str,
+    number_of_judges: int,
+    number_of_candidates: int,
+    criteria: list = DEFAULT_CRITERIA,
+    missing_rate: float = 0.05,
+    seed: int = 0,
+) -> tuple[dict, list]:
+    """
+    returns a form shaped like the award forms made by create_award_form, a
+    grid question per candidate with a row per criterion plus the judge name
+    and affiliation questions, and a response per judge with random scores.
+    missing_rate of the scores are left unanswered
+
+    input: formId, title, number_of_judges, number_of_candidates, criteria
+    output: tuple[dict, list]
+    """
+    rng = random.Random(f"{seed}-{formId}")
+    items = [
+        {
+            "itemId": "judge",
+            "title": "Judge Name",
+            "questionItem": {"question": {"questionId": "judge", "textQuestion": {}}},
+        },
+        {
+            "itemId": "affiliation",
+            "title": "Affiliation",
+            "questionItem": {
+                "question": {
+                    "questionId": "affiliation",
+                    "choiceQuestion": {
+                        "type": "DROP_DOWN",
+                        "options": [{"value": value} for value in AFFILIATIONS],
+                    },
+                }
+            },
+        },
+    ]
+    score_question_ids = []
+    for candidate_index in range(number_of_candidates):
+        questions = []
+        for criterion_index, criterion in enumerate(criteria):
+            questionId = f"c{candidate_index}q{criterion_index}"
+            score_question_ids.append(questionId)
+            questions.append(
+                {"questionId": questionId, "rowQuestion": {"title": criterion}}
+            )
+        items.append(
+            {
+                "itemId": f"c{candidate_index}",
+                "title": f"Candidate {candidate_index:03d}",
+                "questionGroupItem": {"questions": questions},
+            }
+        )
+    form = {
+        "formId": formId,
+        "info": {"title": title, "documentTitle": title},
+        "revisionId": "00000001",
+        "responderUri": f"https://docs.google.com/forms/d/e/{formId}/viewform",
+        "items": items,
+    }
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    responses = []
+    for judge_index in range(number_of_judges):
+        values = {
+            "judge": f"Judge {judge_index:03d}",
+            "affiliation": rng.choice(AFFILIATIONS),
+        }
+        for questionId in score_question_ids:
+            if rng.random() >= missing_rate:
+                values[questionId] = str(rng.randint(1, 10))
+        submitted_time = _format_timestamp(start + timedelta(minutes=judge_index))
+        responses.append(
+            {
+                "formId": formId,
+                "responseId": f"{formId}-r{judge_index}",
+                "createTime": submitted_time,
+                "lastSubmittedTime": submitted_time,
+                "answers": {
+                    questionId: {
+                        "questionId": questionId,
+                        "textAnswers": {"answers": [{"value": value}]},
+                    }
+                    for questionId, value in values.items()
+                },
+            }
+        )
+    return form, responses
+
+
+def generate_applicants_sheet(number_of_candidates: int) -> dict:
+    """
+    returns a values().get() result shaped like the applicants sheet read by
+    convert_sheet_data_to_df and process_df
+    """
+    header = ["Name", "Individual/Project/Alumni", "For Individual Nominations only"]
+    categories = [
+        ("Individual", "Achievement in Science"),
+        ("Project", ""),
+        ("Alumni Association", ""),
+    ]
+    rows = []
+    for index in range(number_of_candidates):
+        # like the api, the trailing empty cells of a row are left out
+        row = [f" Applicant {index:03d}\n", *categories[index % len(categories)]]
+        while row and row[-1] == "":
+            row.pop()
+        rows.append(row)
+    return {"majorDimension": "ROWS", "values": [header, *rows]}
+
+
+def generate_award_document(criteria: list = DEFAULT_CRITERIA) -> dict:
+    """
+    returns a document shaped like the one read by build_award_index, the
+    award titles and criteria tables sit at the content indexes listed in Award
+    """
+
+    def paragraph(text: str) -> dict:
+        return {"paragraph": {"elements": [{"textRun": {"content": f"{text}\n"}}]}}
+
+    def table(title: str) -> dict:
+        rows = [title, *criteria]
+        return {
+            "table": {
+                "tableRows": [
+                    {"tableCells": [{"content": [paragraph(text)]}]} for text in rows
+                ]
+            }
+        }
+
+    content: list = [paragraph("") for _ in range(21)]
+    for title_index, table_index, name in [
+        (3, 4, "Individual"),
+        (6, 7, "Project"),
+        (19, 20, "Alumni Association"),
+    ]:
+        content[title_index] = paragraph(f"{name} award")
+        content[table_index] = table("Criteria")
+    return {
+        "documentId": "document",
+        "revisionId": "revision000001",
+        "body": {"content": content},
+    }
+
+
+class Fake_google:
+    """
+    in memory stand-in for the parts of the drive, forms, sheets and docs apis
+    used by service_template. http() returns an httplib2 compatible object to
+    build the services with, each thread needs its own like a real one. Every
+    request is counted in calls by endpoint, and every round trip, a batch
+    call being a single one, under "http". latency seconds are spent on every
+    http round trip and error_rate of the requests are answered with a 429
+
+    input: latency, error_rate, seed
+    """
+
+    def __init__(
+        self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.forms: dict[str, dict] = {}
+        self.responses: dict[str, list] = {}
+        self.files: dict[str, dict] = {}
+        self.spreadsheets: dict[str, dict] = {}
+        self.documents: dict[str, dict] = {}
+        # the id of the file of every change, a page token is a position in it
+        self.changes: list[str] = []
+        self.calls: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def with_forms(
+        cls,
+        number_of_forms: int,
+        number_of_judges: int,
+        number_of_candidates: int,
+        **kwargs: Any,
+    ) -> "Fake_google":
+        """
+        returns a backend with number_of_forms generated forms, see generate_form
+        """
+        fake = cls(**kwargs)
+        for form_index in range(number_of_forms):
+            form, responses = generate_form(
+                f"form{form_index:04d}",
+                f"Award {form_index:04d}",
+                number_of_judges,
+                number_of_candidates,
+                seed=fake._seed,
+            )
+            fake.add_form(form, responses)
+        return fake
+
+    def add_form(self, form: dict, responses: Optional[list] = None) -> None:
+        with self._lock:
+            self.forms[form["formId"]] = form
+            self.responses[form["formId"]] = list(responses or [])
+            self.files[form["formId"]] = {
+                "id": form["formId"],
+                "name": form["info"]["title"],
+                "mimeType": FORM_MIME_TYPE,
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+                "parents": [],
+                "owners": [],
+            }
+            self.changes.append(form["formId"])
+
+    def add_responses(self, formId: str, responses: list) -> None:
+        """
+        submits responses to a form, drive lists the form as changed
+        """
+        with self._lock:
+            self.responses[formId].extend(responses)
+            self.changes.append(formId)
+
+    def http(self) -> "Fake_http":
+        return Fake_http(self)
+
+    def reset_calls(self) -> Counter:
+        """
+        returns the calls counted so far and starts counting from zero
+        """
+        with self._lock:
+            calls = self.calls
+            self.calls = Counter()
+        return calls
+
+    def _count(self, endpoint: str, number: int = 1) -> None:
+        with self._lock:
+            self.calls[endpoint] += number
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}{self._next_id:06d}"
+
+    def handle(
+        self, host: str, method: str, path_and_query: str, body: Optional[bytes]
+    ) -> tuple[int, dict]:
+        """
+        answers a single, not batched, request and returns (status, content)
+        """
+        url = urlsplit(path_and_query)
+        path = unquote(url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        payload = json.loads(body) if body else {}
+        try:
+            with self._lock:
+                rate_limited = self._rng.random() < self.error_rate
+            if rate_limited:
+                self._count("rate_limited")
+                raise Fake_error(429, "Quota exceeded", "rateLimitExceeded")
+            if host.startswith("forms."):
+                return 200, self._handle_forms(method, path, query, payload)
+            if host.startswith("sheets."):
+                ranges = parse_qs(url.query).get("ranges", [])
+                return 200, self._handle_sheets(method, path, ranges)
+            if host.startswith("docs."):
+                return 200, self._handle_docs(method, path, query)
+            return 200, self._handle_drive(method, path, query)
+        except Fake_error as error:
+            return error.status, error.to_content()
+
+    def _handle_forms(self, method: str, path: str, query: dict, payload: dict) -> dict:
+        match = _FORMS_PATH.match(path)
+        if match is None:
+            raise Fake_error(404, f"unknown path [{path}]")
+        formId, rest = match["formId"], match["rest"]
+        if formId is None and method == "POST":
+            self._count("forms.create")
+            return self._create_form(payload)
+        if formId not in self.forms:
+            raise Fake_error(404, f"Requested entity was not found [{formId}]")
+        if rest == "" and method == "GET":
+            self._count("forms.get")
+            return self.forms[formId]
+        if rest == ":batchUpdate" and method == "POST":
+            self._count("forms.batchUpdate")
+            return self._batch_update_form(formId, payload)
+        if rest == "/responses" and method == "GET":
+            self._count("forms.responses.list")
+            return self._list_responses(formId, query)
+        raise Fake_error(404, f"unknown path [{path}]")
+
+    def _create_form(self, payload: dict) -> dict:
+        formId = self._new_id("created")
+        info = payload.get("info", {})
+        form = {
+            "formId": formId,
+            "info": {
+                "title": info.get("title", ""),
+                "documentTitle": info.get("documentTitle", ""),
+            },
+            "revisionId": "00000001",
+            "responderUri": f"https://docs.google.com/forms/d/e/{formId}/viewform",
+        }
+        self.add_form(form)
+        return form
+
+    def _batch_update_form(self, formId: str, payload: dict) -> dict:
+        with self._lock:
+            form = json.loads(json.dumps(self.forms[formId]))
+        replies: list = []
+        for request in payload.get("requests", []):
+            if "updateFormInfo" in request:
+                update = request["updateFormInfo"]
+                for key in update["updateMask"].split(","):
+                    form["info"][key] = update["info"][key]
+                replies.append({})
+            elif "createItem" in request:
+                item = json.loads(json.dumps(request["createItem"]["item"]))
+                item["itemId"] = self._new_id("item")
+                questionIds = []
+                if "questionGroupItem" in item:
+                    for question in item["questionGroupItem"]["questions"]:
+                        question["questionId"] = self._new_id("q")
+                        questionIds.append(question["questionId"])
+                elif "questionItem" in item:
+                    question = item["questionItem"]["question"]
+                    question["questionId"] = self._new_id("q")
+                    questionIds.append(question["questionId"])
+                items = form.setdefault("items", [])
+                index = request["createItem"].get("location", {}).get("index", 0)
+                items.insert(index, item)
+                replies.append(
+                    {
+                        "createItem": {
+                            "itemId": item["itemId"],
+                            "questionId": questionIds,
+                        }
+                    }
+                )
+            else:
+                raise Fake_error(400, f"unsupported request {list(request)}")
+        form["revisionId"] = f"{int(form['revisionId']) + 1:08d}"
+        with self._lock:
+            self.forms[formId] = form
+            self.files[formId]["name"] = form["info"]["title"]
+            self.changes.append(formId)
+        return {"replies": replies, "writeControl": {"requiredRevisionId": "x"}}
+
+    def _list_responses(self, formId: str, query: dict) -> dict:
+        with self._lock:
+            responses = list(self.responses[formId])
+        filter = query.get("filter")
+        if filter:
+            match = re.match(r"timestamp\s*(>=|>)\s*(\S+)", filter)
+            if match is None:
+                raise Fake_error(400, f"invalid filter [{filter}]")
+            since = to_datetime(match[2])
+            submitted_times = [
+                to_datetime(response["lastSubmittedTime"]) for response in responses
+            ]
+            responses = [
+                response
+                for response, submitted_time in zip(responses, submitted_times)
+                if submitted_time > since
+                or (match[1] == ">=" and submitted_time == since)
+            ]
+        return self._page(responses, "responses", query, default_page_size=5000)
+
+    def _page(self, items: list, key: str, query: dict, default_page_size: int) -> dict:
+        start = int(query.get("pageToken", 0))
+        page_size = int(query.get("pageSize", default_page_size))
+        page = items[start : start + page_size]
+        result: dict = {key: page} if page else {}
+        if start + page_size < len(items):
+            result["nextPageToken"] = str(start + page_size)
+        return result
+
+    def _handle_drive(self, method: str, path: str, query: dict) -> dict:
+        changes_match = _DRIVE_CHANGES_PATH.match(path)
+        if changes_match is not None and method == "GET":
+            return self._list_changes(changes_match["start"] is not None, query)
+        match = _DRIVE_PATH.match(path)
+        if match is None:
+            raise Fake_error(404, f"unknown path [{path}]")
+        fileId = match["fileId"]
+        if fileId is None and method == "GET":
+            self._count("drive.files.list")
+            return self._page(
+                self._query_files(query.get("q", "")),
+                "files",
+                query,
+                default_page_size=100,
+            )
+        if fileId not in self.files:
+            raise Fake_error(404, f"File not found: {fileId}")
+        if method == "GET":
+            self._count("drive.files.get")
+            return self.files[fileId]
+        if method == "DELETE":
+            self._count("drive.files.delete")
+            with self._lock:
+                del self.files[fileId]
+                self.forms.pop(fileId, None)
+                self.responses.pop(fileId, None)
+                self.changes.append(fileId)
+            return {}
+        raise Fake_error(404, f"unknown path [{path}]")
+
+    def _list_changes(self, start: bool, query: dict) -> dict:
+        with self._lock:
+            changes = list(self.changes)
+            files = dict(self.files)
+        if start:
+            self._count("drive.changes.getStartPageToken")
+            return {"startPageToken": str(len(changes))}
+        self._count("drive.changes.list")
+        first = int(query["pageToken"])
+        page_size = int(query.get("pageSize", 100))
+        result: dict = {"changes": []}
+        for fileId in changes[first : first + page_size]:
+            file = files.get(fileId)
+            change: dict = {"fileId": fileId, "removed": file is None}
+            if file is not None:
+                change["file"] = {
+                    **file,
+                    "trashed": False,
+                    "owners": [{"emailAddress": owner} for owner in file["owners"]],
+                }
+            result["changes"].append(change)
+        if first + page_size < len(changes):
+            result["nextPageToken"] = str(first + page_size)
+        else:
+            result["newStartPageToken"] = str(len(changes))
+        return result
+
+    def _query_files(self, q: str) -> list:
+        conditions = {
+            name: _unquote_query_value(match[1])
+            for name, pattern in _QUERY_CONDITIONS.items()
+            if (match := pattern.search(q))
+        }
+        with self._lock:
+            files = sorted(self.files.values(), key=lambda file: file["id"])
+        if "name_prefix" in conditions:
+            files = [f for f in files if conditions["name_prefix"] in f["name"]]
+        if "folderId" in conditions:
+            files = [f for f in files if conditions["folderId"] in f["parents"]]
+        if "owner" in conditions:
+            files = [f for f in files if conditions["owner"] in f["owners"]]
+        if "modified_after" in conditions:
+            files = [
+                f for f in files if f["modifiedTime"] > conditions["modified_after"]
+            ]
+        return [
+            {key: file[key] for key in ("id", "name", "modifiedTime")} for file in files
+        ]
+
+    def _handle_sheets(self, method: str, path: str, ranges: list) -> dict:
+        match = _SHEETS_PATH.match(path)
+        if match is None or method != "GET":
+            raise Fake_error(404, f"unknown path [{path}]")
+        spreadsheet = self.spreadsheets.get(match["spreadsheetId"])
+        if spreadsheet is None:
+            raise Fake_error(404, "Requested entity was not found.")
+        if match["batchGet"] is not None:
+            # every range of the fake spreadsheet holds the same values
+            self._count("sheets.values.batchGet")
+            return {
+                "spreadsheetId": match["spreadsheetId"],
+                "valueRanges": [{"range": range, **spreadsheet} for range in ranges],
+            }
+        if match["range"] is None:
+            self._count("sheets.spreadsheets.get")
+            return {"spreadsheetId": match["spreadsheetId"]}
+        self._count("sheets.values.get")
+        return {"range": match["range"], **spreadsheet}
+
+    def _handle_docs(self, method: str, path: str, query: dict) -> dict:
+        match = _DOCS_PATH.match(path)
+        if match is None or method != "GET":
+            raise Fake_error(404, f"unknown path [{path}]")
+        document = self.documents.get(match["documentId"])
+        if document is None:
+            raise Fake_error(404, "Requested entity was not found.")
+        self._count("docs.documents.get")
+        if "fields" in query:
+            # only the top level fields, enough for fields="revisionId"
+            fields = query["fields"].split(",")
+            return {key: value for key, value in document.items() if key in fields}
+        return document
+
+    def handle_batch(self, host: str, body: bytes, content_type: str) -> bytes:
+        """
+        answers a multipart batch call, one part per request
+        """
+        self._count("batch")
+        message = BytesParser().parsebytes(
+            f"content-type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = "fake_google_batch"
+        parts = []
+        for part in message.walk():
+            if part.is_multipart():
+                continue
+            request = str(part.get_payload())
+            head, separator, request_body = request.partition("\r\n\r\n")
+            if not separator:
+                head, separator, request_body = request.partition("\n\n")
+            method, path_and_query, _ = head.splitlines()[0].split(" ", 2)
+            status, content = self.handle(
+                host, method, path_and_query, request_body.encode() or None
+            )
+            content_id = str(part["Content-ID"]).replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(content)}\r\n"
+            )
+        parts.append(f"--{boundary}--")
+        return "".join(parts).encode()
+
+
+class Fake_http:
+    """
+    the httplib2.Http interface googleapiclient uses, answered by a Fake_google
+    """
+
+    def __init__(self, backend: Fake_google) -> None:
+        self.backend = backend
+        self.timeout: Optional[float] = None
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Any = None,
+        headers: Optional[dict] = None,
+        redirections: int = 5,
+        connection_type: Any = None,
+    ) -> tuple[httplib2.Response, bytes]:
+        self.backend._count("http")
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+        if isinstance(body, str):
+            body = body.encode()
+        url = urlsplit(uri)
+        path_and_query = url.path + (f"?{url.query}" if url.query else "")
+        if url.path.startswith("/batch"):
+            content_type = (headers or {}).get("content-type", "")
+            content = self.backend.handle_batch(url.netloc, body, content_type)
+            response = httplib2.Response(
+                {
+                    "status": "200",
+                    "content-type": "multipart/mixed; boundary=fake_google_batch",
+                }
+            )
+            return response, content
+        status, result = self.backend.handle(url.netloc, method, path_and_query, body)
+        response = httplib2.Response(
+            {"status": str(status), "content-type": "application/json"}
+        )
+        return response, json.dumps(result).encode()
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,224 @@
+import json
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, Optional
+
+from atomic_file import write_json
+from log import logger
+from settings import FORM_SCHEMA_DIRECTORY_PATH
+
+
+# the kinds of questions asked once per response whose answers are scores,
+# the answers of the other ones, such as text and choice questions, are kept
+# as they are
+SCALE_QUESTION_KINDS = ("scaleQuestion", "ratingQuestion")
+
+
+class Form_schema:
+    """
+    compiled, read only index of the questions of one revision of a form.
+    columns are the columns of the responses dataframe in the order of the
+    items of the form, candidates the rows of each response. score_positions
+    maps the question id of a grid question to its (candidate, column)
+    position, and response_columns the question id of a question asked once
+    per response, like the judge name, to its column. scale_columns are the
+    response columns of scale questions, which hold scores like the grid
+    questions
+
+    input: formId, revisionId, columns, candidates, score_positions,
+        response_columns, scale_columns
+    """
+
+    __slots__ = (
+        "formId",
+        "revisionId",
+        "columns",
+        "candidates",
+        "score_positions",
+        "response_columns",
+        "scale_columns",
+        "judge_question_id",
+    )
+
+    formId: str
+    revisionId: str
+    columns: tuple[str, ...]
+    candidates: tuple[str, ...]
+    score_positions: Mapping[str, tuple[int, int]]
+    response_columns: Mapping[str, int]
+    scale_columns: frozenset[int]
+    judge_question_id: Optional[str]
+
+    def __init__(
+        self,
+        formId: str,
+        revisionId: str,
+        columns: tuple[str, ...],
+        candidates: tuple[str, ...],
+        score_positions: Mapping[str, tuple[int, int]],
+        response_columns: Mapping[str, int],
+        scale_columns: Iterable[int] = (),
+    ) -> None:
+        set_attribute = object.__setattr__
+        set_attribute(self, "formId", formId)
+        set_attribute(self, "revisionId", revisionId)
+        set_attribute(self, "columns", tuple(columns))
+        set_attribute(self, "candidates", tuple(candidates))
+        set_attribute(self, "score_positions", MappingProxyType(dict(score_positions)))
+        set_attribute(
+            self, "response_columns", MappingProxyType(dict(response_columns))
+        )
+        set_attribute(self, "scale_columns", frozenset(scale_columns))
+        set_attribute(
+            self,
+            "judge_question_id",
+            next(
+                (
+                    question_id
+                    for question_id, column_position in response_columns.items()
+                    if self.columns[column_position] == "Judge Name"
+                ),
+                None,
+            ),
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Form_schema is read only")
+
+    def __repr__(self) -> str:
+        return (
+            f"Form_schema({self.formId}, {self.revisionId}, "
+            f"{len(self.candidates)} candidates, {len(self.columns)} columns)"
+        )
+
+    @property
+    def score_columns(self) -> tuple[str, ...]:
+        """
+        the columns holding scores, of the grid and scale questions, in the
+        order of the columns
+        """
+        score_positions = {
+            column_position for _, column_position in self.score_positions.values()
+        } | self.scale_columns
+        return tuple(
+            column
+            for column_position, column in enumerate(self.columns)
+            if column_position in score_positions
+        )
+
+    @classmethod
+    def from_form(cls, form: dict) -> "Form_schema":
+        """
+        walks the items of a form resource once, the items that are not
+        questions, such as page breaks, are skipped
+        """
+        columns: list[str] = []
+        column_positions: dict[str, int] = {}
+        candidates: list[str] = []
+        score_positions: dict[str, tuple[int, int]] = {}
+        response_columns: dict[str, int] = {}
+        scale_columns: list[int] = []
+
+        def get_column_position(column: str) -> int:
+            if column not in column_positions:
+                column_positions[column] = len(columns)
+                columns.append(column)
+            return column_positions[column]
+
+        for item in form.get("items", []):
+            if "questionGroupItem" in item:
+                candidate_position = len(candidates)
+                candidates.append(item["title"])
+                get_column_position("candidate")
+                for question in item["questionGroupItem"]["questions"]:
+                    score_positions[question["questionId"]] = (
+                        candidate_position,
+                        get_column_position(question["rowQuestion"]["title"]),
+                    )
+            elif "questionItem" in item:
+                question = item["questionItem"]["question"]
+                column_position = get_column_position(item["title"])
+                response_columns[question["questionId"]] = column_position
+                if any(kind in question for kind in SCALE_QUESTION_KINDS):
+                    scale_columns.append(column_position)
+        return cls(
+            form["formId"],
+            form["revisionId"],
+            tuple(columns),
+            tuple(candidates),
+            score_positions,
+            response_columns,
+            scale_columns,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "formId": self.formId,
+            "revisionId": self.revisionId,
+            "columns": list(self.columns),
+            "candidates": list(self.candidates),
+            "score_positions": {
+                question_id: list(position)
+                for question_id, position in self.score_positions.items()
+            },
+            "response_columns": dict(self.response_columns),
+            "scale_columns": sorted(self.scale_columns),
+        }
+
+    @classmethod
+    def from_dict(cls, schema: dict) -> "Form_schema":
+        return cls(
+            schema["formId"],
+            schema["revisionId"],
+            tuple(schema["columns"]),
+            tuple(schema["candidates"]),
+            {
+                question_id: (position[0], position[1])
+                for question_id, position in schema["score_positions"].items()
+            },
+            schema["response_columns"],
+            schema["scale_columns"],
+        )
+
+
+# the schemas by (formId, revisionId), shared by the handlers of every thread
+_form_schemas: dict[tuple[str, str], Form_schema] = {}
+_form_schemas_lock = threading.Lock()
+
+
+def get_form_schema(
+    form: dict, schema_directory: Optional[Path] = FORM_SCHEMA_DIRECTORY_PATH
+) -> Form_schema:
+    """
+    returns the schema of the revision of form, from memory, then from
+    schema_directory, and builds and saves it only for a revision not seen
+    before. A changed form gets a new revisionId and so a new schema
+
+    input: form, schema_directory, None to keep the schemas in memory only
+    output: Form_schema
+    """
+    key = (form["formId"], form["revisionId"])
+    with _form_schemas_lock:
+        if key in _form_schemas:
+            return _form_schemas[key]
+    path = (
+        Path(schema_directory) / f"{key[0]}_{key[1]}.json"
+        if schema_directory is not None
+        else None
+    )
+    schema = None
+    if path is not None and path.exists():
+        try:
+            schema = Form_schema.from_dict(json.loads(path.read_text()))
+        except KeyError:
+            # saved before scale_columns, built again below
+            logger.info(f"schema [{path}] is out of date")
+    if schema is None:
+        schema = Form_schema.from_form(form)
+        if path is not None:
+            write_json(path, schema.to_dict())
+            logger.info(f"saved the schema of form [{key[0]}] to [{path}]")
+    with _form_schemas_lock:
+        _form_schemas[key] = schema
+    return schema
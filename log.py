@@ -1,25 +1,38 @@
 import logging
 from datetime import datetime
+from pathlib import Path
+from typing import Optional
 from settings import DEBUG, LOG_DIRECTORY_PATH
 
 
 _LOG_FORMAT = "%(asctime)s %(levelname)s - %(funcName)s: %(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+logger = logging.getLogger("caa_forms")
+logger.setLevel(level=logging.DEBUG if DEBUG else logging.INFO)
 
 
-def _create_file_handler() -> logging.FileHandler:
+def _create_file_handler(log_directory: Path) -> logging.FileHandler:
     current_time_string = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_directory.mkdir(parents=True, exist_ok=True)
     handler = logging.FileHandler(
-        filename=LOG_DIRECTORY_PATH / f"caa_forms_{current_time_string}.log"
+        filename=log_directory / f"caa_forms_{current_time_string}.log"
     )
     handler.setFormatter(logging.Formatter(fmt=_LOG_FORMAT))
     return handler
 
 
-logging.basicConfig(
-    format=_LOG_FORMAT,
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-
-logger = logging.getLogger("caa_forms")
-logger.setLevel(level=logging.DEBUG if DEBUG else logging.INFO)
-logger.addHandler(_create_file_handler())
+def configure_logging(
+    log_directory: Optional[Path] = LOG_DIRECTORY_PATH,
+) -> None:
+    """
+    sends the log to stderr and, unless log_directory is None, to a new
+    timestamped file in log_directory. Called by the commands that do some
+    work, importing the modules no longer creates a log file. Only the first
+    call adds the file handler
+    """
+    logging.basicConfig(format=_LOG_FORMAT, datefmt=_DATE_FORMAT)
+    if log_directory is not None and not any(
+        isinstance(handler, logging.FileHandler) for handler in logger.handlers
+    ):
+        logger.addHandler(_create_file_handler(Path(log_directory)))
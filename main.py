@@ -1,127 +1,469 @@
 # %%
-from cred import get_credentials
-from service_template import (
-    # Document_service,
-    Drive_service,
-    Form_handler,
-    # Form_service,
-    # Sheet_service,
+import json
+from argparse import ArgumentParser
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+from log import configure_logging, logger
+from metrics import metrics, profile_run
+from pool import run_in_pool
+from settings import (
+    DEFAULT_RANKING_STRATEGIES,
+    DOCUMENT_ID,
+    EXPORT_COMPRESSION,
+    EXPORT_FORMAT,
+    EXPORT_WORKERS,
+    FORMS_FOLDER_ID,
+    FORMS_MODIFIED_AFTER,
+    FORMS_NAME_PREFIX,
+    FORMS_OWNER,
+    INCREMENTAL_SYNC,
+    MAJOR_DIMENSION,
+    METRICS_PATH,
+    OUTPUT_DIRECTORY_PATH,
+    PROFILE_PATH,
+    RANGES,
+    SPREADSHEET_ID,
+    TRACE_MEMORY,
+    WATCH_HOST,
+    WATCH_PORT,
 )
-from log import logger
 
-# from settings import MAJOR_DIMENSION, RANGE, SPREADSHEET_ID
-# from utils import Form_Type, convert_sheet_data_to_df, process_df
-from argparse import ArgumentParser
+# pandas and the google libraries take most of the start up time, they are
+# imported by the functions of the actions that use them so --help and bad
+# arguments return at once
+if TYPE_CHECKING:
+    from export_sink import Export_sink
+    from service_template import Form_handler
+    from utils import Form_Type
 
 
 # %%
-def export_all_forms_to_csv(drive_service_instance: Drive_service) -> None:
-    forms_ids = [form["id"] for form in drive_service_instance.list_forms()["files"]]
-    for form_id in forms_ids:
-        form_instance = Form_handler(formId=form_id)
-        form_instance.export_all_responses_to_csv()
+def run_for_all_forms(
+    forms_ids: list,
+    action: Callable[["Form_handler"], None],
+    workers: int = 1,
+    **handler_kwargs: Any,
+) -> dict:
+    """
+    runs action on a Form_handler for each form, see run_in_pool(), and
+    returns {form_id: exception} for the forms that failed. handler_kwargs
+    are passed to every Form_handler
+    """
+    from service_template import Form_handler
+
+    # the forms are fetched in batch calls, each worker thread then sends
+    # the requests of its handler through its own form service
+    handlers = Form_handler.from_form_ids(forms_ids, **handler_kwargs)
+
+    def run_for_form(form_id: str) -> None:
+        action(handlers[form_id])
+
+    _, errors = run_in_pool(forms_ids, run_for_form, workers, "form with id")
+    return errors
+
+
+def create_all_forms(
+    workers: int = 1,
+    sink: Optional["Export_sink"] = None,
+    form_types: Optional[Iterable["Form_Type"]] = None,
+) -> dict:
+    """
+    creates an award form for each form type with a grid question per
+    nominee. The applicants sheet and the criteria document are read once
+    and the forms are created on a pool of worker threads, the form types
+    without nominees are skipped. returns {form title: form url}, which is
+    also saved with the sink
+
+    input: workers, sink, form_types, all the Form_Type by default
+    output: dict
+    """
+    from service_template import (
+        Document_service,
+        Form_handler,
+        Sheet_service,
+        client_registry,
+    )
+    from utils import (
+        Form_Type,
+        convert_form_type_enum_to_award_enum,
+        convert_value_ranges_to_df,
+        process_df,
+    )
+
+    with metrics.stage("read_nominations"):
+        value_ranges = client_registry.get(Sheet_service).get_data_from_sheets(
+            SPREADSHEET_ID, RANGES, MAJOR_DIMENSION
+        )
+        group_dataframes_of_applicatants = process_df(
+            convert_value_ranges_to_df(value_ranges)
+        )
+    award_index = client_registry.get(Document_service).get_award_index(DOCUMENT_ID)
+
+    form_types_to_create = []
+    for form_type in Form_Type if form_types is None else form_types:
+        award_enum = convert_form_type_enum_to_award_enum(form_type)
+        if (
+            award_enum.value[2],
+            form_type.value,
+        ) in group_dataframes_of_applicatants.groups:
+            form_types_to_create.append(form_type)
+        else:
+            logger.info(f"no nominees for [{form_type.value}], form not created")
+
+    def create_form(form_type: Form_Type) -> str:
+        form = Form_handler(
+            form_title=form_type.value,
+            documentTitle=str(form_type.value) + " document",
+        )
+        form.create_award_form(
+            group_dataframes_of_applicatants,
+            form_type,
+            award_index=award_index,
+        )
+        return form.form_url
+
+    forms_urls, errors = run_in_pool(
+        form_types_to_create, create_form, workers, "form creation"
+    )
+    created_forms = {
+        form_type.value: form_url for form_type, form_url in forms_urls.items()
+    }
+    for form_title, form_url in created_forms.items():
+        logger.info(f"created form [{form_title}] at [{form_url}]")
+    if sink is not None:
+        sink.save_json(
+            {
+                "forms": created_forms,
+                "failed": {
+                    form_type.value: str(error) for form_type, error in errors.items()
+                },
+            },
+            "created_forms",
+            "all",
+        )
+    return created_forms
+
+
+def get_forms_ids(form_filters: dict, offline: bool = False) -> list:
+    """
+    returns the ids of the forms matching the filters from drive, or the ids
+    of all the forms in the local store when offline
+    """
+    if offline:
+        from response_store import response_store
+
+        return [form["id"] for form in response_store.list_forms()]
+    from service_template import Drive_service, client_registry
+
+    drive_service_instance = client_registry.get(Drive_service)
+    return drive_service_instance.get_list_of_forms_ids(**form_filters)
+
+
+def get_changed_forms_ids(form_filters: dict) -> tuple[list, str]:
+    """
+    returns the ids of the forms matching form_filters that drive reports as
+    changed since the page token saved by the last run with the same
+    filters, and the page token to save once they are processed. The first
+    run returns all the forms, the token is taken before listing them so the
+    changes made during the run are seen by the next one
+
+    input: form_filters
+    output: tuple[list, str]
+    """
+    from response_store import response_store
+    from service_template import Drive_service, client_registry
+
+    drive_service_instance = client_registry.get(Drive_service)
+    page_token = response_store.get_page_token(get_page_token_name(form_filters))
+    if page_token is None:
+        logger.info("no saved drive changes page token, processing all the forms")
+        new_page_token = drive_service_instance.get_start_page_token()
+        return (
+            drive_service_instance.get_list_of_forms_ids(**form_filters),
+            new_page_token,
+        )
+    return drive_service_instance.list_changed_forms(page_token, **form_filters)
+
+
+def get_page_token_name(form_filters: dict) -> str:
+    # a token per set of filters, a run with other filters must not skip the
+    # changes of forms it has not processed
+    return "drive_changes " + json.dumps(form_filters, sort_keys=True)
+
+
+def save_page_token(
+    form_filters: dict, page_token: str, errors: Optional[dict]
+) -> None:
+    """
+    saves the page token of get_changed_forms_ids() once the forms are
+    processed, it is kept when some failed so the next run tries them again
+    """
+    from response_store import response_store
+
+    if errors:
+        logger.warning(
+            f"[{len(errors)}] forms failed, the drive changes page token is kept"
+        )
+        return
+    response_store.save_page_token(get_page_token_name(form_filters), page_token)
+
+
+def export_all_forms_to_csv(
+    forms_ids: list, workers: int = 1, **handler_kwargs: Any
+) -> dict:
+    from service_template import Form_handler
+
+    return run_for_all_forms(
+        forms_ids, Form_handler.export_all_responses_to_csv, workers, **handler_kwargs
+    )
+
+
+def export_ranking_to_csv(
+    forms_ids: list, workers: int = 1, **handler_kwargs: Any
+) -> dict:
+    from service_template import Form_handler
+
+    return run_for_all_forms(
+        forms_ids,
+        Form_handler.export_candidates_ranking_to_csv,
+        workers,
+        **handler_kwargs,
+    )
+
+
+def export_missing_scores(
+    forms_ids: list, workers: int = 1, **handler_kwargs: Any
+) -> dict:
+    from service_template import Form_handler
+
+    return run_for_all_forms(
+        forms_ids, Form_handler.export_missing_scores_report, workers, **handler_kwargs
+    )
+
+
+def export_all(
+    forms_ids: list,
+    stages: Optional[list] = None,
+    workers: int = 1,
+    **handler_kwargs: Any,
+) -> dict:
+    """
+    fetches each form once and writes the output of the stages from it, all
+    the EXPORT_STAGES by default
+    """
 
+    def export_form(form_instance: "Form_handler") -> None:
+        form_instance.export(stages)
 
-def export_ranking_to_csv(drive_service_instance: Drive_service) -> None:
-    forms_ids = [form["id"] for form in drive_service_instance.list_forms()["files"]]
-    for form_id in forms_ids:
-        form_instance = Form_handler(formId=form_id)
-        form_instance.export_candidates_ranking_to_csv()
+    return run_for_all_forms(forms_ids, export_form, workers, **handler_kwargs)
 
 
-def temp_arg() -> None:
-    drive = Drive_service(credentials=get_credentials())
-    list_of_forms = drive.get_list_of_forms_ids()
-    for formId in list_of_forms:
-        form_instance = Form_handler(formId=formId)
-        form_instance.temp_call()
+def temp_arg(forms_ids: list, workers: int = 1, **handler_kwargs: Any) -> None:
+    from service_template import Form_handler
+
+    run_for_all_forms(forms_ids, Form_handler.temp_call, workers, **handler_kwargs)
+
+
+def build_handler_kwargs(Parser: ArgumentParser, args: Any) -> dict:
+    """
+    returns the keyword arguments of the Form_handler of every form, the
+    strategies, stages and format are checked here rather than by the parser
+    as listing them means importing pandas
+    """
+    from export_sink import Export_sink
+    from ranking import RANKING_STRATEGIES
+    from service_template import EXPORT_STAGES
+
+    for option, values, choices in [
+        ("--strategies", args.strategies, RANKING_STRATEGIES),
+        ("--stages", args.stages or [], EXPORT_STAGES),
+    ]:
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            Parser.error(
+                f"argument {option}: invalid choice: {unknown} "
+                f"(choose from {', '.join(choices)})"
+            )
+    try:
+        sink = Export_sink(args.output_dir, args.format, args.compression)
+    except ValueError as error:
+        Parser.error(f"argument --format/--compression: {error}")
+    return {
+        "incremental": args.incremental,
+        "offline": args.offline,
+        "ranking_strategies": args.strategies,
+        "sink": sink,
+    }
 
 
 def main() -> None:
-    logger.info("Starting CAA forms process")
     Parser = ArgumentParser(description="")
     Parser.add_argument(
         "-a",
         "--action",
-        choices=["export_all_candidates", "create_all", "export_ranking", "temp"],
+        choices=[
+            "export_all_candidates",
+            "create_all",
+            "export_ranking",
+            "export_missing_scores",
+            "export_all",
+            "export_consolidated",
+            "watch",
+            "temp",
+        ],
         required=True,
     )
+    Parser.add_argument("--folder", default=FORMS_FOLDER_ID, help="drive folder id")
+    Parser.add_argument("--name-prefix", default=FORMS_NAME_PREFIX)
+    Parser.add_argument("--owner", default=FORMS_OWNER, help="owner email")
+    Parser.add_argument(
+        "--modified-after",
+        default=FORMS_MODIFIED_AFTER,
+        help="RFC 3339 timestamp, e.g. 2024-01-01T00:00:00",
+    )
+    Parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=EXPORT_WORKERS,
+        help="number of forms processed at the same time",
+    )
+    Parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        default=INCREMENTAL_SYNC,
+        help="only fetch the responses submitted since the last run",
+    )
+    Parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="use the forms and responses in the local store, no api calls",
+    )
+    Parser.add_argument(
+        "--changes",
+        action="store_true",
+        help="only process the forms drive reports as changed since the last run "
+        "with --changes and the same filters, the first run processes them all",
+    )
+    Parser.add_argument(
+        "-s",
+        "--strategies",
+        nargs="+",
+        default=DEFAULT_RANKING_STRATEGIES,
+        help="ranking strategies used by export_ranking, see "
+        "ranking.RANKING_STRATEGIES",
+    )
+    Parser.add_argument(
+        "--stages",
+        nargs="+",
+        help="outputs written by export_all, all of service_template.EXPORT_STAGES "
+        "by default",
+    )
+    Parser.add_argument(
+        "-f",
+        "--format",
+        default=EXPORT_FORMAT,
+        help="file format of the exports, csv, parquet or feather, the last two "
+        "need pyarrow",
+    )
+    Parser.add_argument(
+        "--compression",
+        default=EXPORT_COMPRESSION,
+        help="compression of the exports, gzip, bz2 or xz for csv, snappy, gzip, "
+        "brotli, lz4, zstd or none for parquet and lz4, zstd or uncompressed for "
+        "feather",
+    )
+    Parser.add_argument(
+        "-o", "--output-dir", default=OUTPUT_DIRECTORY_PATH, help="export folder"
+    )
+    Parser.add_argument(
+        "--metrics",
+        default=METRICS_PATH,
+        help="write the api calls and stage timings of the run, as a prometheus "
+        "textfile for a .prom file and as json otherwise",
+    )
+    Parser.add_argument(
+        "--profile", default=PROFILE_PATH, help="write a cProfile of the run"
+    )
+    Parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        default=TRACE_MEMORY,
+        help="trace the peak memory of the run with tracemalloc",
+    )
+    Parser.add_argument(
+        "--host", default=WATCH_HOST, help="address the watch action serves on"
+    )
+    Parser.add_argument(
+        "--port",
+        type=int,
+        default=WATCH_PORT,
+        help="port of the rankings served by the watch action, at /rankings",
+    )
     args = Parser.parse_args()
+    if args.changes and args.offline:
+        Parser.error("argument --changes: not allowed with argument --offline")
+    if args.action == "watch" and args.offline:
+        Parser.error("argument --offline: not allowed with the watch action")
+    if args.action == "export_consolidated" and args.changes:
+        # the consolidated report covers every form, not the changed ones only
+        Parser.error("argument --changes: not allowed with export_consolidated")
+    configure_logging()
+    logger.info("Starting CAA forms process")
+    form_filters = {
+        "folderId": args.folder,
+        "name_prefix": args.name_prefix,
+        "owner": args.owner,
+        "modified_after": args.modified_after,
+    }
 
-    # Create service instances with credentials
-    # form_service_instance = Form_service(get_credentials())
-    drive_service_instance = Drive_service(get_credentials())
-    # sheet_service_instance = Sheet_service(get_credentials())
-    # document_service_instance = Document_service(get_credentials())
+    handler_kwargs = build_handler_kwargs(Parser, args)
 
-    if args.action == "export_all_candidates":
-        export_all_forms_to_csv(drive_service_instance)
-    elif args.action == "create_all":
-        pass
-    elif args.action == "export_ranking":
-        export_ranking_to_csv(drive_service_instance)
-    elif args.action == "temp":
-        temp_arg()
-    else:
-        print("Invalid action")
+    with profile_run(args.profile, args.trace_memory):
+        if args.action == "create_all":
+            create_all_forms(args.workers, handler_kwargs["sink"])
+        elif args.action == "watch":
+            from watch import watch
 
+            watch(form_filters, args.workers, handler_kwargs, args.host, args.port)
+        else:
+            page_token = None
+            if args.changes:
+                forms_ids, page_token = get_changed_forms_ids(form_filters)
+            else:
+                forms_ids = get_forms_ids(form_filters, args.offline)
+            errors: Optional[dict] = None
+            if args.action == "export_all_candidates":
+                errors = export_all_forms_to_csv(
+                    forms_ids, args.workers, **handler_kwargs
+                )
+            elif args.action == "export_ranking":
+                errors = export_ranking_to_csv(
+                    forms_ids, args.workers, **handler_kwargs
+                )
+            elif args.action == "export_missing_scores":
+                errors = export_missing_scores(
+                    forms_ids, args.workers, **handler_kwargs
+                )
+            elif args.action == "export_all":
+                errors = export_all(
+                    forms_ids, args.stages, args.workers, **handler_kwargs
+                )
+            elif args.action == "export_consolidated":
+                from aggregate import export_consolidated
 
-if __name__ == "__main__":
-    main()
+                errors = export_consolidated(forms_ids, args.workers, handler_kwargs)
+            elif args.action == "temp":
+                temp_arg(forms_ids, args.workers, **handler_kwargs)
+            else:
+                print("Invalid action")
+            if page_token is not None:
+                save_page_token(form_filters, page_token, errors)
+    metrics.log_summary()
+    if args.metrics:
+        metrics.write(args.metrics)
 
 
-# %%
-# read the applicatants data from the google sheet
-# group_dataframes_of_applicatants = process_df(
-#     convert_sheet_data_to_df(
-#         sheet_service_instance.get_data_from_sheet(
-#             SPREADSHEET_ID, RANGE, MAJOR_DIMENSION
-#         )
-#     )
-# )
-
-# # %%
-# # export all forms to local csv files
-# forms_ids = [form["id"] for form in drive_service_instance.list_forms()["files"]]
-# for form_id in forms_ids:
-#     form_instance = Form_handler(formId=form_id)
-#     form_instance.map_responses_to_questions()
-
-
-# # %%
-# # Create a form
-# form = form_handler(form_service_instance=form_service_instance, form_title="Test Form")
-# # %%
-# # make award form
-# form.create_award_form(
-#     group_dataframes_of_applicatants, Form_Type.PROJECT, document_service_instance
-# )
-# # %%
-# # create all forms
-# for form_type in Form_Type:
-#     form = Form_handler(
-#         form_service_instance=form_service_instance,
-#         form_title=form_type.value,
-#         documentTitle=str(form_type.value) + " document",
-#     )
-#     form.create_award_form(
-#         group_dataframes_of_applicatants, form_type, document_service_instance
-#     )
-#     print("Created form for: ", form_type.value, " form url", form.get_form_url())
-# # %%
-
-
-# def get_forms_names_and_links() -> list:
-#     drive = Drive_service(get_credentials())
-#     forms = drive.list_forms()["files"]
-#     forms_names_and_links = []
-#     for form in forms:
-#         form_object = Form_handler(formId=form["id"])
-#         forms_names_and_links.append(
-#             {"name": form_object.form_type, "link": form_object.get_form_url()}
-#         )
-#     return forms_names_and_links
-
-
-# print(get_forms_names_and_links())
-# %%
+if __name__ == "__main__":
+    main()
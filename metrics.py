@@ -0,0 +1,320 @@
+import bisect
+import cProfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, TypeVar
+
+from atomic_file import write_json, write_text
+from log import logger
+
+_Item = TypeVar("_Item")
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket
+# is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_PREFIX = "caa_forms"
+
+
+def _escape_label(label: object) -> str:
+    """
+    escapes a label value as the prometheus text format requires, a form
+    title may hold any of these characters
+    """
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Call_metrics:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.response_bytes = 0
+        self.timed_calls = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "response_bytes": self.response_bytes,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.timed_calls if self.timed_calls else 0,
+            "latency_buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)
+            ),
+        }
+
+
+class _Stage_metrics:
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class Metrics:
+    """
+    counts the api calls of the run by method, with their latency histogram
+    and response bytes, and times the stages of the Form_handler pipeline.
+    Shared by all the threads, write() saves a summary as json or as a
+    prometheus textfile
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls: defaultdict[str, _Call_metrics] = defaultdict(_Call_metrics)
+            self._stages: defaultdict[str, _Stage_metrics] = defaultdict(_Stage_metrics)
+            self._retries: defaultdict[str, int] = defaultdict(int)
+            self._dataframe_bytes: dict[str, int] = {}
+            self.peak_memory_bytes: Optional[int] = None
+            self._started = time.perf_counter()
+
+    def record_call(
+        self, method: str, seconds: Optional[float] = None, error: bool = False
+    ) -> None:
+        """
+        counts a call of method, seconds is None for the requests inside a
+        batch call, their round trip is recorded as the batch call
+        """
+        with self._lock:
+            call_metrics = self._calls[method]
+            call_metrics.calls += 1
+            call_metrics.errors += error
+            if seconds is not None:
+                call_metrics.timed_calls += 1
+                call_metrics.seconds += seconds
+                call_metrics.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def record_response_bytes(self, method: str, response_bytes: int) -> None:
+        with self._lock:
+            self._calls[method].response_bytes += response_bytes
+
+    def record_retry(self, method: str) -> None:
+        with self._lock:
+            self._retries[method] += 1
+
+    def record_dataframe_bytes(self, form: str, dataframe_bytes: int) -> None:
+        """
+        records the memory taken by the responses dataframe of form
+        """
+        with self._lock:
+            self._dataframe_bytes[form] = dataframe_bytes
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stage_metrics = self._stages[stage]
+            stage_metrics.count += 1
+            stage_metrics.seconds += seconds
+            stage_metrics.max_seconds = max(stage_metrics.max_seconds, seconds)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    def time_iterator(self, stage: str, iterator: Iterator[_Item]) -> Iterator[_Item]:
+        """
+        yields the items of iterator and records the time spent producing
+        them as stage, without the time the consumer spends on each item
+        """
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self.record_stage(stage, seconds)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            calls = {method: m.to_dict() for method, m in sorted(self._calls.items())}
+            return {
+                "run_seconds": time.perf_counter() - self._started,
+                "api_calls": sum(m["calls"] for m in calls.values()),
+                "api_seconds": sum(m["seconds"] for m in calls.values()),
+                "calls": calls,
+                "retries": dict(sorted(self._retries.items())),
+                "stages": {
+                    stage: m.to_dict() for stage, m in sorted(self._stages.items())
+                },
+                "dataframe_bytes": dict(sorted(self._dataframe_bytes.items())),
+                "peak_memory_bytes": self.peak_memory_bytes,
+            }
+
+    def to_prometheus(self) -> str:
+        summary = self.to_dict()
+        lines = []
+
+        def add(name: str, kind: str, help: str, samples: list) -> None:
+            lines.append(f"# HELP {_PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                labels_text = ",".join(
+                    f'{key}="{_escape_label(label)}"' for key, label in labels
+                )
+                lines.append(
+                    f"{_PREFIX}_{name}{{{labels_text}}} {value}"
+                    if labels_text
+                    else f"{_PREFIX}_{name} {value}"
+                )
+
+        calls = summary["calls"]
+        add(
+            "api_calls_total",
+            "counter",
+            "api requests by method",
+            [([("method", m)], c["calls"]) for m, c in calls.items()],
+        )
+        add(
+            "api_errors_total",
+            "counter",
+            "failed api requests by method",
+            [([("method", m)], c["errors"]) for m, c in calls.items()],
+        )
+        add(
+            "api_response_bytes_total",
+            "counter",
+            "bytes of the api responses by method",
+            [([("method", m)], c["response_bytes"]) for m, c in calls.items()],
+        )
+        add(
+            "api_retries_total",
+            "counter",
+            "retried api requests by method",
+            [([("method", m)], count) for m, count in summary["retries"].items()],
+        )
+        lines.append(
+            f"# HELP {_PREFIX}_api_request_duration_seconds api round trip time"
+        )
+        lines.append(f"# TYPE {_PREFIX}_api_request_duration_seconds histogram")
+        for method, call_metrics in calls.items():
+            cumulative = 0
+            for bound, count in call_metrics["latency_buckets"].items():
+                cumulative += count
+                lines.append(
+                    f"{_PREFIX}_api_request_duration_seconds_bucket"
+                    f'{{method="{_escape_label(method)}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"{_PREFIX}_api_request_duration_seconds_sum"
+                f'{{method="{_escape_label(method)}"}} {call_metrics["seconds"]}'
+            )
+            lines.append(
+                f"{_PREFIX}_api_request_duration_seconds_count"
+                f'{{method="{_escape_label(method)}"}} {cumulative}'
+            )
+        stages = summary["stages"]
+        add(
+            "stage_seconds_total",
+            "counter",
+            "time spent in each stage of the forms pipeline",
+            [([("stage", s)], m["seconds"]) for s, m in stages.items()],
+        )
+        add(
+            "stage_runs_total",
+            "counter",
+            "runs of each stage of the forms pipeline",
+            [([("stage", s)], m["count"]) for s, m in stages.items()],
+        )
+        add(
+            "responses_dataframe_bytes",
+            "gauge",
+            "memory taken by the responses dataframe of each form",
+            [([("form", f)], size) for f, size in summary["dataframe_bytes"].items()],
+        )
+        add(
+            "run_seconds",
+            "gauge",
+            "duration of the run",
+            [([], summary["run_seconds"])],
+        )
+        if summary["peak_memory_bytes"] is not None:
+            add(
+                "peak_memory_bytes",
+                "gauge",
+                "peak memory traced by tracemalloc",
+                [([], summary["peak_memory_bytes"])],
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> Path:
+        """
+        writes the summary to path, as a prometheus textfile for a .prom
+        path and as json otherwise. The file is replaced atomically so a
+        collector never reads half of it
+        """
+        path = Path(path)
+        if path.suffix == ".prom":
+            write_text(path, self.to_prometheus())
+        else:
+            write_json(path, self.to_dict(), indent=2)
+        logger.info(f"saved run metrics to [{path}]")
+        return path
+
+    def log_summary(self) -> None:
+        summary = self.to_dict()
+        logger.info(
+            f"run took [{summary['run_seconds']:.2f}]s with [{summary['api_calls']}] "
+            f"api calls taking [{summary['api_seconds']:.2f}]s"
+        )
+        for stage, stage_metrics in summary["stages"].items():
+            logger.info(
+                f"stage [{stage}] ran [{stage_metrics['count']}] times taking "
+                f"[{stage_metrics['seconds']:.2f}]s"
+            )
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profile_run(
+    profile_path: Optional[Path] = None, trace_memory: bool = False
+) -> Iterator[None]:
+    """
+    runs the block under cProfile, saving the stats to profile_path for
+    pstats or snakeviz, and under tracemalloc, saving the peak memory in
+    metrics, when asked for. cProfile only sees the calling thread, profile
+    with a single worker to see the forms pipeline
+    """
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profile_path is not None and profiler is not None:
+            profiler.disable()
+            Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            logger.info(f"saved the profile of the run to [{profile_path}]")
+        if trace_memory:
+            _, metrics.peak_memory_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
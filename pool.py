@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
+
+from log import logger
+
+
+def run_in_pool(
+    keys: list, function: Callable[[Any], Any], workers: int = 1, name: str = "form"
+) -> tuple[dict, dict]:
+    """
+    calls function with each key on a pool of worker threads, or one key
+    after the other with a single worker, and returns ({key: result},
+    {key: exception}), a failing key does not stop the others
+    """
+    results = {}
+    errors = {}
+
+    def collect(key: Any, run: Callable[[], Any]) -> None:
+        try:
+            results[key] = run()
+            logger.info(f"finished {name} [{key}]")
+        except Exception as error:
+            logger.exception(f"failed {name} [{key}]: {error}")
+            errors[key] = error
+
+    if workers <= 1:
+        # in the calling thread, so a --profile of the run sees the work
+        for key in keys:
+            collect(key, lambda: function(key))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(function, key): key for key in keys}
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+    if errors:
+        logger.error(f"[{len(errors)}] of [{len(keys)}] {name}s failed: {list(errors)}")
+    return results, errors
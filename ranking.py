@@ -0,0 +1,158 @@
+from collections.abc import Callable, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from settings import TRIM_PROPORTION
+from utils import get_score_columns
+
+# the columns of get_judge_scores() that are not part of the candidate key
+JUDGE_COLUMNS = ["judge", "score"]
+
+
+def get_judge_scores(
+    responses_df: pd.DataFrame, by: Sequence[str] = ()
+) -> pd.DataFrame:
+    """
+    returns a dataframe with the mean score each judge gave each candidate,
+    preceded by the by columns of responses_df, such as the form of each
+    response when the responses of several forms are ranked together
+
+    candidate | judge   | score
+    ---------------------------
+    candidate1| Judge 1 | 7.5
+    candidate1| Judge 2 | 6.0
+    """
+    score_columns = [
+        column for column in get_score_columns(responses_df) if column not in by
+    ]
+    return pd.DataFrame(
+        {
+            **{column: responses_df[column].to_numpy() for column in by},
+            "candidate": responses_df["candidate"].to_numpy(),
+            "judge": responses_df["Judge Name"].to_numpy(),
+            # the scores are stored as float32, the means are taken in float64
+            "score": responses_df[score_columns]
+            .astype("float64")
+            .mean(axis=1)
+            .to_numpy(),
+        }
+    )
+
+
+def get_candidate_keys(judge_scores: pd.DataFrame) -> list[str]:
+    """
+    returns the columns identifying a candidate in judge_scores, the by
+    columns of get_judge_scores() and candidate, the strategies score the
+    candidates of each group of by on their own
+    """
+    return [column for column in judge_scores.columns if column not in JUDGE_COLUMNS]
+
+
+def mean_of_judge_means(judge_scores: pd.DataFrame) -> pd.Series:
+    return judge_scores.groupby(get_candidate_keys(judge_scores))["score"].mean()
+
+
+def median_of_judge_means(judge_scores: pd.DataFrame) -> pd.Series:
+    return judge_scores.groupby(get_candidate_keys(judge_scores))["score"].median()
+
+
+def trimmed_mean_of_judge_means(
+    judge_scores: pd.DataFrame, proportion: float = TRIM_PROPORTION
+) -> pd.Series:
+    """
+    mean of the judge means without the lowest and highest proportion of the
+    judges of each candidate
+    """
+    candidate_keys = get_candidate_keys(judge_scores)
+    scores = judge_scores.groupby(candidate_keys)["score"]
+    position = scores.rank(method="first")
+    count = scores.transform("count")
+    cut = np.floor(count * proportion)
+    kept = judge_scores[(position > cut) & (position <= count - cut)]
+    # the candidates whose judges were all trimmed away score NaN
+    candidates = judge_scores[candidate_keys].drop_duplicates()
+    return (
+        kept.groupby(candidate_keys)["score"]
+        .mean()
+        .reindex(
+            pd.MultiIndex.from_frame(candidates)
+            if len(candidate_keys) > 1
+            else pd.Index(candidates["candidate"], name="candidate")
+        )
+    )
+
+
+def mean_of_judge_z_scores(judge_scores: pd.DataFrame) -> pd.Series:
+    """
+    mean of the judge means after normalising the scores of each judge to a
+    mean of 0 and a standard deviation of 1, so strict and generous judges
+    weigh the same. A judge with a single candidate or identical scores gives
+    0. A judge of several groups is normalised within each group
+    """
+    candidate_keys = get_candidate_keys(judge_scores)
+    scores = judge_scores.groupby([*candidate_keys[:-1], "judge"])["score"]
+    std = scores.transform("std")
+    z_scores = (judge_scores["score"] - scores.transform("mean")) / std
+    z_scores = z_scores.where(std > 0, 0.0).where(judge_scores["score"].notna())
+    return z_scores.groupby([judge_scores[column] for column in candidate_keys]).mean()
+
+
+RANKING_STRATEGIES: dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "mean": mean_of_judge_means,
+    "median": median_of_judge_means,
+    "trimmed_mean": trimmed_mean_of_judge_means,
+    "zscore": mean_of_judge_z_scores,
+}
+
+
+def rank_candidates(
+    responses_df: pd.DataFrame,
+    strategies: Iterable[str] = ("mean",),
+    by: Sequence[str] = (),
+) -> pd.DataFrame:
+    """
+    scores the candidates with each strategy in RANKING_STRATEGIES from the
+    same judge scores and returns a dataframe sorted by strategy and rank.
+    With by, the candidates of each group of the by columns are scored and
+    ranked apart, in a single pass over responses_df, and the by columns come
+    first
+
+    candidate | strategy | score | rank
+    -----------------------------------
+    candidate2| mean     | 8.25  | 1
+    candidate1| mean     | 6.5   | 2
+    """
+    strategies = list(strategies)
+    unknown_strategies = set(strategies) - set(RANKING_STRATEGIES)
+    if unknown_strategies:
+        raise ValueError(
+            f"unknown ranking strategies {sorted(unknown_strategies)}, "
+            f"choose from {list(RANKING_STRATEGIES)}"
+        )
+    by = list(by)
+    if responses_df.empty:
+        return pd.DataFrame(columns=[*by, "candidate", "strategy", "score", "rank"])
+    judge_scores = get_judge_scores(responses_df, by)
+    rankings = []
+    for strategy in strategies:
+        scores = RANKING_STRATEGIES[strategy](judge_scores)
+        rankings.append(
+            pd.DataFrame(
+                {
+                    **{
+                        column: scores.index.get_level_values(column)
+                        for column in [*by, "candidate"]
+                    },
+                    "strategy": strategy,
+                    "score": scores.to_numpy(),
+                }
+            )
+        )
+    ranking = pd.concat(rankings, ignore_index=True)
+    ranking["rank"] = (
+        ranking.groupby([*by, "strategy"])["score"]
+        .rank(method="min", ascending=False)
+        .astype("Int64")
+    )
+    return ranking.sort_values([*by, "strategy", "rank"], ignore_index=True)
@@ -0,0 +1,291 @@
+import json
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+from log import logger
+from metrics import metrics
+from settings import (
+    BATCH_SIZE,
+    DOCS_REQUESTS_PER_MINUTE,
+    DRIVE_REQUESTS_PER_MINUTE,
+    FORMS_REQUESTS_PER_MINUTE,
+    MAX_IN_FLIGHT_REQUESTS,
+    MAX_RETRIES,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    SHEETS_REQUESTS_PER_MINUTE,
+)
+
+if TYPE_CHECKING:
+    from googleapiclient.discovery import Resource
+    from googleapiclient.http import HttpRequest
+
+# the api did not process these requests, they are always safe to send again
+_RATE_LIMIT_STATUSES = {429}
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+_SERVER_ERROR_STATUSES = {500, 502, 503, 504}
+# a server error may come after the request was applied, only the requests
+# that can be repeated without side effects are sent again
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+
+def _get_error_reason(error: HttpError) -> Optional[str]:
+    try:
+        details = json.loads(error.content.decode("utf-8"))["error"]
+        return details["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def is_retryable(error: Exception, method: str = "GET") -> bool:
+    """
+    True for rate limit errors, and for server and connection errors of
+    idempotent requests
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in _RATE_LIMIT_STATUSES:
+            return True
+        if status == 403 and _get_error_reason(error) in _RATE_LIMIT_REASONS:
+            return True
+        return status in _SERVER_ERROR_STATUSES and method in _IDEMPOTENT_METHODS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return method in _IDEMPOTENT_METHODS
+    return False
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    if not isinstance(error, HttpError):
+        return None
+    try:
+        return float(error.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_method(request: "HttpRequest") -> str:
+    return request.methodId or request.uri.split("?")[0]
+
+
+def _count_response_bytes(request: "HttpRequest") -> None:
+    """
+    wraps the postproc of the request to record the size of its response,
+    which also sees the responses of the requests sent in a batch
+    """
+    postproc = request.postproc
+
+    def counting_postproc(response: Any, content: bytes) -> Any:
+        metrics.record_response_bytes(_get_method(request), len(content or b""))
+        return postproc(response, content)
+
+    request.postproc = counting_postproc
+
+
+class Token_bucket:
+    """
+    rate limiter that lets through rate_per_minute requests on average and
+    bursts of at most capacity requests, shared by all the threads
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate_per_minute / 60
+        # a burst of a second's worth of requests, the quotas are per minute
+        # but the api also rejects short spikes
+        self.capacity = capacity if capacity is not None else max(self.rate, 1)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        blocks until tokens are available and returns the seconds waited. A
+        request for more tokens than the capacity waits for a full bucket and
+        leaves it in debt, so the next requests wait for the difference
+        """
+        needed = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return waited
+                wait = (needed - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+class Request_executor:
+    """
+    sends the requests of one api, and every service built for that api shares
+    it. Requests wait for the token bucket tuned to the per minute quota of the
+    api, at most max_in_flight requests are sent at the same time, and the
+    retryable failures are sent again after an exponential backoff with full
+    jitter
+
+    input: name, rate_per_minute, max_in_flight, max_retries, base_delay, max_delay
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_minute: float,
+        max_in_flight: int = MAX_IN_FLIGHT_REQUESTS,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.name = name
+        self.token_bucket = Token_bucket(rate_per_minute, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight = threading.BoundedSemaphore(max(max_in_flight, 1))
+        self._sleep = sleep
+
+    def get_backoff_delay(
+        self, attempt: int, error: Optional[Exception] = None
+    ) -> float:
+        retry_after = _get_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def execute(self, request: "HttpRequest") -> dict:
+        """
+        sends the request, retrying it up to max_retries times
+        """
+        method = _get_method(request)
+        _count_response_bytes(request)
+        attempt = 0
+        while True:
+            self.token_bucket.acquire()
+            try:
+                with self._in_flight:
+                    start = time.perf_counter()
+                    try:
+                        # the retries of the client library would skip the
+                        # limiter
+                        result = request.execute(num_retries=0)
+                    except Exception:
+                        metrics.record_call(method, time.perf_counter() - start, True)
+                        raise
+                    metrics.record_call(method, time.perf_counter() - start)
+                    return result
+            except Exception as error:
+                if attempt >= self.max_retries or not is_retryable(
+                    error, request.method
+                ):
+                    raise
+                metrics.record_retry(method)
+                delay = self.get_backoff_delay(attempt, error)
+                logger.warning(
+                    f"[{self.name}] request failed with [{error}], retry "
+                    f"[{attempt + 1}] of [{self.max_retries}] in [{delay:.2f}]s"
+                )
+                self._sleep(delay)
+                attempt += 1
+
+    def execute_batch(
+        self,
+        service: "Resource",
+        requests: dict[str, "HttpRequest"],
+        batch_size: int = BATCH_SIZE,
+    ) -> tuple[dict, dict]:
+        """
+        sends independent requests as multipart batch calls of at most
+        batch_size requests each and returns ({request_id: response},
+        {request_id: exception}), a failing request does not affect the others
+        in the batch. Every request of a batch counts against the quota, and
+        the ones that failed with a retryable error are sent again in a later
+        batch
+
+        input: service, requests as {request_id: request}, batch_size
+        output: tuple[dict, dict]
+        """
+        results: dict = {}
+        errors: dict = {}
+
+        def callback(request_id: str, response: dict, exception: Exception) -> None:
+            metrics.record_call(
+                _get_method(requests[request_id]), error=exception is not None
+            )
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                results[request_id] = response
+
+        for request in requests.values():
+            _count_response_bytes(request)
+        pending = dict(requests)
+        attempt = 0
+        while pending:
+            requests_items = list(pending.items())
+            for start in range(0, len(requests_items), batch_size):
+                batch_items = requests_items[start : start + batch_size]
+                batch = service.new_batch_http_request(callback=callback)
+                for request_id, request in batch_items:
+                    batch.add(request, request_id=request_id)
+                self.token_bucket.acquire(len(batch_items))
+                sent = time.perf_counter()
+                try:
+                    with self._in_flight:
+                        batch.execute()
+                    metrics.record_call(
+                        f"{self.name}.batch", time.perf_counter() - sent
+                    )
+                except Exception as batch_error:
+                    metrics.record_call(
+                        f"{self.name}.batch", time.perf_counter() - sent, True
+                    )
+                    # the whole batch call failed, so did every request in it
+                    for request_id, _ in batch_items:
+                        errors[request_id] = batch_error
+            pending = {
+                request_id: requests[request_id]
+                for request_id, error in errors.items()
+                if is_retryable(error, requests[request_id].method)
+            }
+            if not pending or attempt >= self.max_retries:
+                break
+            delay = max(
+                self.get_backoff_delay(attempt, errors[request_id])
+                for request_id in pending
+            )
+            logger.warning(
+                f"[{self.name}] [{len(pending)}] batch requests failed, retry "
+                f"[{attempt + 1}] of [{self.max_retries}] in [{delay:.2f}]s"
+            )
+            for request_id in pending:
+                metrics.record_retry(_get_method(requests[request_id]))
+                del errors[request_id]
+            self._sleep(delay)
+            attempt += 1
+        for request_id, error in errors.items():
+            logger.info(f"batch request [{request_id}] failed with [{error}]")
+        return results, errors
+
+
+request_executors = {
+    "docs": Request_executor("docs", DOCS_REQUESTS_PER_MINUTE),
+    "drive": Request_executor("drive", DRIVE_REQUESTS_PER_MINUTE),
+    "forms": Request_executor("forms", FORMS_REQUESTS_PER_MINUTE),
+    "sheets": Request_executor("sheets", SHEETS_REQUESTS_PER_MINUTE),
+}
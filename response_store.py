@@ -0,0 +1,302 @@
+import json
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from settings import STORE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forms (
+    formId TEXT PRIMARY KEY,
+    revisionId TEXT NOT NULL,
+    title TEXT NOT NULL,
+    lastSubmittedTime TEXT,
+    form TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    formId TEXT NOT NULL,
+    questionId TEXT NOT NULL,
+    candidate TEXT,
+    criterion TEXT NOT NULL,
+    PRIMARY KEY (formId, questionId)
+);
+CREATE INDEX IF NOT EXISTS questions_candidate ON questions (formId, candidate);
+CREATE TABLE IF NOT EXISTS responses (
+    formId TEXT NOT NULL,
+    responseId TEXT NOT NULL,
+    lastSubmittedTime TEXT,
+    judge TEXT,
+    response TEXT NOT NULL,
+    PRIMARY KEY (formId, responseId)
+);
+CREATE INDEX IF NOT EXISTS responses_judge ON responses (formId, judge);
+CREATE TABLE IF NOT EXISTS answers (
+    formId TEXT NOT NULL,
+    responseId TEXT NOT NULL,
+    questionId TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (formId, responseId, questionId)
+);
+CREATE INDEX IF NOT EXISTS answers_question ON answers (formId, questionId);
+CREATE TABLE IF NOT EXISTS page_tokens (
+    name TEXT PRIMARY KEY,
+    pageToken TEXT NOT NULL
+);
+"""
+
+
+def to_datetime(timestamp: str) -> datetime:
+    # the api sends up to nanoseconds, datetime only keeps microseconds
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    return datetime.fromisoformat(f"{seconds}.{(fraction + '000000')[:6]}+00:00")
+
+
+def get_latest_time(timestamps: Iterable[Optional[str]]) -> Optional[str]:
+    """
+    returns the latest of the timestamps, None when all of them are None
+    """
+    return max(
+        (timestamp for timestamp in timestamps if timestamp),
+        key=to_datetime,
+        default=None,
+    )
+
+
+def get_answer_value(answer: dict) -> str:
+    return answer["textAnswers"]["answers"][0]["value"]
+
+
+class Response_store:
+    """
+    local sqlite copy of the forms structure and their raw responses. The
+    questions and answers are also stored one row per question so they can
+    be looked up by form, candidate, judge and question id
+    """
+
+    def __init__(self, path: Path = STORE_PATH) -> None:
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_created = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # a connection per call, sqlite connections can not be shared between
+        # the export worker threads
+        with self._schema_lock:
+            if not self._schema_created:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with sqlite3.connect(self.path) as connection:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(_SCHEMA)
+                self._schema_created = True
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def save_form(self, form: dict) -> None:
+        """
+        saves the form and its questions. The stored responses of a form
+        whose revisionId changed are dropped, since its questions may have
+        changed, so the next sync fetches them all again
+        """
+        questions = []
+        for item in form.get("items", []):
+            if "questionGroupItem" in item:
+                for question in item["questionGroupItem"]["questions"]:
+                    questions.append(
+                        (
+                            form["formId"],
+                            question["questionId"],
+                            item["title"],
+                            question["rowQuestion"]["title"],
+                        )
+                    )
+            elif "questionItem" in item:
+                questions.append(
+                    (
+                        form["formId"],
+                        item["questionItem"]["question"]["questionId"],
+                        None,
+                        item["title"],
+                    )
+                )
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT revisionId FROM forms WHERE formId = ?", (form["formId"],)
+            ).fetchone()
+            if row and row[0] != form["revisionId"]:
+                self._clear_responses(connection, form["formId"])
+            connection.execute(
+                """
+                INSERT INTO forms (formId, revisionId, title, form)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (formId) DO UPDATE SET
+                    revisionId = excluded.revisionId,
+                    title = excluded.title,
+                    form = excluded.form
+                """,
+                (
+                    form["formId"],
+                    form["revisionId"],
+                    form["info"]["title"],
+                    json.dumps(form),
+                ),
+            )
+            connection.execute(
+                "DELETE FROM questions WHERE formId = ?", (form["formId"],)
+            )
+            connection.executemany(
+                "INSERT INTO questions VALUES (?, ?, ?, ?)", questions
+            )
+
+    def get_form(self, formId: str) -> Optional[dict]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT form FROM forms WHERE formId = ?", (formId,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_forms(self) -> list:
+        """
+        returns [{"id": formId, "name": title}, ...] for the stored forms
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT formId, title FROM forms ORDER BY title"
+            ).fetchall()
+        return [{"id": formId, "name": title} for formId, title in rows]
+
+    def get_last_submitted_time(self, formId: str) -> Optional[str]:
+        """
+        returns the lastSubmittedTime the responses of the form were last
+        fully synced up to, None when they never were
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT lastSubmittedTime FROM forms WHERE formId = ?", (formId,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_last_submitted_time(
+        self, formId: str, lastSubmittedTime: Optional[str]
+    ) -> None:
+        """
+        saves the lastSubmittedTime the responses of the form are synced up
+        to, once all of them are saved, see save_responses()
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE forms SET lastSubmittedTime = ? WHERE formId = ?",
+                (lastSubmittedTime, formId),
+            )
+
+    def clear_responses(self, formId: str) -> None:
+        with self._connect() as connection:
+            self._clear_responses(connection, formId)
+
+    def _clear_responses(self, connection: sqlite3.Connection, formId: str) -> None:
+        connection.execute("DELETE FROM answers WHERE formId = ?", (formId,))
+        connection.execute("DELETE FROM responses WHERE formId = ?", (formId,))
+        connection.execute(
+            "UPDATE forms SET lastSubmittedTime = NULL WHERE formId = ?", (formId,)
+        )
+
+    def save_responses(self, formId: str, responses: list) -> Optional[str]:
+        """
+        adds new responses and replaces edited ones, returns the latest
+        lastSubmittedTime of the responses. The lastSubmittedTime of the form
+        is left as is, it is only moved once every page of a sync is saved,
+        see save_last_submitted_time()
+        """
+        if not responses:
+            return None
+        with self._connect() as connection:
+            judge_question_ids = {
+                questionId
+                for (questionId,) in connection.execute(
+                    "SELECT questionId FROM questions "
+                    "WHERE formId = ? AND criterion = 'Judge Name'",
+                    (formId,),
+                )
+            }
+            responses_rows: list[tuple] = []
+            answers_rows: list[tuple] = []
+            for response in responses:
+                answers = {
+                    questionId: get_answer_value(answer)
+                    for questionId, answer in response.get("answers", {}).items()
+                }
+                judge = next(
+                    (answers[id] for id in judge_question_ids if id in answers), None
+                )
+                responses_rows.append(
+                    (
+                        formId,
+                        response["responseId"],
+                        response.get("lastSubmittedTime"),
+                        judge,
+                        json.dumps(response),
+                    )
+                )
+                answers_rows.extend(
+                    (formId, response["responseId"], questionId, value)
+                    for questionId, value in answers.items()
+                )
+            connection.executemany(
+                "DELETE FROM answers WHERE formId = ? AND responseId = ?",
+                [row[:2] for row in responses_rows],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                responses_rows,
+            )
+            connection.executemany(
+                "INSERT INTO answers VALUES (?, ?, ?, ?)", answers_rows
+            )
+        return get_latest_time(row[2] for row in responses_rows)
+
+    def get_responses(self, formId: str) -> list:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT response FROM responses WHERE formId = ? ORDER BY rowid",
+                (formId,),
+            ).fetchall()
+        return [json.loads(response) for (response,) in rows]
+
+    def count_responses(self, formId: str) -> int:
+        with self._connect() as connection:
+            (count,) = connection.execute(
+                "SELECT COUNT(*) FROM responses WHERE formId = ?", (formId,)
+            ).fetchone()
+        return count
+
+    def get_page_token(self, name: str) -> Optional[str]:
+        """
+        returns the drive changes page token saved as name, see
+        main.get_changed_forms_ids()
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT pageToken FROM page_tokens WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_page_token(self, name: str, pageToken: str) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                """
+                INSERT INTO page_tokens (name, pageToken) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET pageToken = excluded.pageToken
+                """,
+                (name, pageToken),
+            )
+
+
+response_store = Response_store()
@@ -1,26 +1,54 @@
+import json
+import threading
 from collections import defaultdict
-
-# from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
-from datetime import datetime
 import pathlib
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, TypeVar
 from log import logger
-import numpy as np
+from metrics import metrics
 
+import numpy as np
 import pandas as pd
-from googleapiclient.discovery import build
 
-from cred import get_credentials
-from settings import DOCUMENT_ID
+from atomic_file import write_json
+from audit import (
+    build_missing_scores_report,
+    get_missing_matrix,
+    get_missing_scores,
+)
+from export_sink import Export_sink
+from form_schema import Form_schema, get_form_schema
+from ranking import rank_candidates
+from request_executor import request_executors
+from response_store import Response_store, get_latest_time, response_store
+from settings import (
+    DEFAULT_RANKING_STRATEGIES,
+    DOCUMENT_ID,
+    DOCUMENT_INDEX_DIRECTORY_PATH,
+    INCREMENTAL_SYNC,
+    RESPONSES_PAGE_SIZE,
+)
 from utils import (
+    SCORE_DTYPE,
+    build_json_for_form_title,
     build_json_for_grid_question,
     build_json_for_select_question,
     build_json_for_text_question,
     build_requests_list,
+    chunk_requests,
+    compact_responses_df,
     convert_form_type_enum_to_award_enum,
+    get_score_columns,
 )
 
+if TYPE_CHECKING:
+    # the google libraries are imported when a service is built, the offline
+    # commands never load them
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import Resource
+    from googleapiclient.http import HttpRequest
+
 
 class Award(Enum):
     INDIVIDUAL_APPLICATIONS = (3, 4, "Individual")
@@ -41,55 +69,197 @@ class Form_Type(Enum):
     PROJECT = "Project"
 
 
+_discovery_documents: dict[tuple[str, str], str] = {}
+_discovery_documents_lock = threading.Lock()
+
+
+def build_service(
+    serviceName: str,
+    version: str,
+    credentials: Optional["service_account.Credentials"] = None,
+    http: Any = None,
+) -> "Resource":
+    """
+    builds a service resource from a discovery document that is read once per
+    process instead of once per build() call. An http object, such as the one
+    of fake_google, replaces the credentials
+    """
+    from googleapiclient import discovery_cache
+    from googleapiclient.discovery import build_from_document
+
+    key = (serviceName, version)
+    with _discovery_documents_lock:
+        if key not in _discovery_documents:
+            _discovery_documents[key] = discovery_cache.get_static_doc(
+                serviceName, version
+            )
+        document = _discovery_documents[key]
+    return build_from_document(document, credentials=credentials, http=http)
+
+
+# the award indexes of the criteria documents by (documentId, revisionId),
+# shared by the Document_service of every thread
+_award_indexes: dict[tuple[str, str], dict] = {}
+_award_indexes_lock = threading.Lock()
+
+
 class Document_service:
-    def __init__(self, credentials: dict) -> None:
-        self.service = build("docs", "v1", credentials=credentials)
+    def __init__(
+        self,
+        credentials: Optional["service_account.Credentials"] = None,
+        http: Any = None,
+        index_directory: pathlib.Path = DOCUMENT_INDEX_DIRECTORY_PATH,
+    ) -> None:
+        self.service = build_service("docs", "v1", credentials, http)
+        self.executor = request_executors["docs"]
+        self.index_directory = pathlib.Path(index_directory)
 
     def get(self, id: str) -> dict:
-        result = self.service.documents().get(documentId=id).execute()
+        result = self.executor.execute(self.service.documents().get(documentId=id))
         return result
 
+    def get_revision_id(self, id: str) -> Optional[str]:
+        result = self.executor.execute(
+            self.service.documents().get(documentId=id, fields="revisionId")
+        )
+        return result.get("revisionId")
+
+    def get_award_index(self, id: str = DOCUMENT_ID) -> dict:
+        """
+        returns the award index of the document, see build_award_index(). Only
+        the revisionId is fetched when the index of that revision is in memory
+        or on disk, an edit of the document gives a new revisionId and so a new
+        index
+
+        input: id, the documentId
+        attributes used: self.index_directory
+        methods used: self.get_revision_id(), self.get(), self.build_award_index()
+        output: dict
+        """
+        revisionId = self.get_revision_id(id)
+        if revisionId is None:
+            # nothing to tell an edited document from the cached one
+            return self.build_award_index(self.get(id))
+        key = (id, revisionId)
+        with _award_indexes_lock:
+            if key in _award_indexes:
+                return _award_indexes[key]
+        path = self.index_directory / f"{id}_{revisionId}.json"
+        if path.exists():
+            award_index = json.loads(path.read_text())
+            logger.info(f"read the award index of document [{id}] from [{path}]")
+        else:
+            award_index = self.build_award_index(self.get(id))
+            write_json(path, award_index, indent=2)
+            logger.info(f"saved the award index of document [{id}] to [{path}]")
+        with _award_indexes_lock:
+            _award_indexes[key] = award_index
+        return award_index
+
+    def build_award_index(self, document: dict) -> dict:
+        """
+        walks the document once and returns {heading: {"index": position of
+        the heading in the body, "criteria": first column of the table
+        after it}}, the heading being the last non empty paragraph before the
+        table
+
+        input: document
+        attributes used: none
+        methods used: self.__get_paragraph_text(),
+            self.__get_first_column_of_table_text()
+        output: dict
+        """
+        award_index = {}
+        heading: Optional[tuple[int, str]] = None
+        for index, element in enumerate(document.get("body", {}).get("content", [])):
+            if "paragraph" in element:
+                text = self.__get_paragraph_text(element["paragraph"])
+                if text:
+                    heading = (index, text)
+            elif "table" in element and heading is not None:
+                award_index[heading[1]] = {
+                    "index": heading[0],
+                    "criteria": self.__get_first_column_of_table_text(element["table"]),
+                }
+                heading = None
+        return award_index
+
     def get_award_info(
-        self, document: dict, award: Enum = Award.INDIVIDUAL_APPLICATIONS
+        self, award_index: dict, award: Enum = Award.INDIVIDUAL_APPLICATIONS
     ) -> dict:
-        index_of_title = award.value[0]
-        index_of_table = award.value[1]
-        award_info = {}
-        award_info[
-            self.__get_award_title(document, index_of_title)
-        ] = self.__get_first_column_of_table_text(document, index_of_table)
-        return award_info
-
-    def __get_award_title(self, document: dict, line: int) -> str:
-        return document["body"]["content"][line]["paragraph"]["elements"][0]["textRun"][
-            "content"
-        ].strip()
-
-    def __get_first_column_of_table_text(
-        self, document: dict, index_of_table: int
-    ) -> list:
         """
-        Returns a list of strings from the first column of a Google Doc
+        returns {heading: criteria} of the award, found by the award name in
+        the headings, then by its position in the Award enum. award_index may
+        also be the document itself
+
+        input: award_index, award
+        attributes used: none
+        methods used: self.build_award_index(), self.__find_award_title()
+        output: dict
+        """
+        if "body" in award_index:
+            award_index = self.build_award_index(award_index)
+        title = self.__find_award_title(award_index, award)
+        return {title: award_index[title]["criteria"]}
+
+    def __find_award_title(self, award_index: dict, award: Enum) -> str:
+        names = [award.value[2].casefold(), award.name.replace("_", " ").casefold()]
+        titles = list(award_index)
+        for title in titles:
+            if title.casefold() in names:
+                return title
+        for title in titles:
+            if any(name in title.casefold() for name in names):
+                return title
+        for title in titles:
+            if award_index[title]["index"] == award.value[0]:
+                logger.warning(
+                    f"no heading names the award [{award.value[2]}], using "
+                    f"[{title}] at its position in the document"
+                )
+                return title
+        raise KeyError(f"no criteria table for the award [{award.value[2]}]")
+
+    def __get_paragraph_text(self, paragraph: dict) -> str:
+        return "".join(
+            element.get("textRun", {}).get("content", "")
+            for element in paragraph.get("elements", [])
+        ).strip()
+
+    def __get_first_column_of_table_text(self, table: dict) -> list:
+        """
+        Returns a list of strings from the first column of a Google Doc table,
+        without its header row
         """
-        table = document["body"]["content"][index_of_table]["table"]
-        first_column = table["tableRows"]
         first_column_text = [
-            element["tableCells"][0]["content"][0]["paragraph"]["elements"][0][
-                "textRun"
-            ]["content"].strip()
-            for element in first_column
+            self.__get_paragraph_text(row["tableCells"][0]["content"][0]["paragraph"])
+            for row in table["tableRows"]
         ]
         return first_column_text[1:]
 
 
 class Form_service:
-    def __init__(self, credentials: dict) -> None:
-        self.service = build("forms", "v1", credentials=credentials)
+    def __init__(
+        self,
+        credentials: Optional["service_account.Credentials"] = None,
+        http: Any = None,
+    ) -> None:
+        self.service = build_service("forms", "v1", credentials, http)
+        self.executor = request_executors["forms"]
 
     def get(self, formId: str) -> dict:
-        result = self.service.forms().get(formId=formId).execute()
+        result = self.executor.execute(self.service.forms().get(formId=formId))
         return result
 
+    def get_many(self, formIds: list) -> tuple[dict, dict]:
+        """
+        returns ({formId: form}, {formId: exception}) fetched in batch calls
+        """
+        requests = {
+            formId: self.service.forms().get(formId=formId) for formId in formIds
+        }
+        return self.executor.execute_batch(self.service, requests)
+
     def create_empty_form(
         self, form_title: str = "Empty Form", documentTitle: str = "Empty Form Document"
     ) -> dict:
@@ -99,64 +269,347 @@ class Form_service:
                 "documentTitle": documentTitle,
             }
         }
-        form = self.service.forms().create(body=NEW_FORM).execute()
+        form = self.executor.execute(self.service.forms().create(body=NEW_FORM))
         return form
 
+    def execute(self, request: "HttpRequest") -> dict:
+        return self.executor.execute(request)
+
 
 class Drive_service:
-    def __init__(self, credentials: dict) -> None:
-        self.service = build("drive", "v3", credentials=credentials)
+    FORM_MIME_TYPE = "application/vnd.google-apps.form"
+    FORM_FIELDS = "nextPageToken, files(id, name, modifiedTime)"
+    CHANGE_FIELDS = (
+        "nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, "
+        "mimeType, trashed, parents, owners(emailAddress), modifiedTime))"
+    )
+
+    def __init__(
+        self,
+        credentials: Optional["service_account.Credentials"] = None,
+        http: Any = None,
+    ) -> None:
+        self.service = build_service("drive", "v3", credentials, http)
+        self.executor = request_executors["drive"]
+        self._forms_cache: dict[tuple, dict] = {}
 
     def get(self, id: str) -> dict:
-        result = self.service.files().get(fileId=id).execute()
+        result = self.executor.execute(self.service.files().get(fileId=id))
         return result
 
-    def list_forms(self) -> dict:
-        result = (
-            self.service.files()
-            .list(q="mimeType='application/vnd.google-apps.form'")
-            .execute()
-        )
+    def delete_many(self, ids: list) -> dict:
+        """
+        deletes the files in batch calls and returns {id: exception} for the
+        files that could not be deleted
+        """
+        requests = {id: self.service.files().delete(fileId=id) for id in ids}
+        _, errors = self.executor.execute_batch(self.service, requests)
+        self.clear_forms_cache()
+        return errors
+
+    def list_forms(
+        self,
+        folderId: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        owner: Optional[str] = None,
+        modified_after: Optional[str] = None,
+        refresh: bool = False,
+    ) -> dict:
+        """
+        returns {"files": [{"id": ..., "name": ..., "modifiedTime": ...}, ...]}
+        with every form matching the filters, following all the pages of the
+        files list. The filters are sent to drive in the query and the result
+        is kept for the life of the instance unless refresh is True
+
+        input: folderId, name_prefix, owner (email), modified_after (RFC 3339)
+        output: dict
+        """
+        key = (folderId, name_prefix, owner, modified_after)
+        if not refresh and key in self._forms_cache:
+            return self._forms_cache[key]
+        query = self.__build_forms_query(folderId, name_prefix, owner, modified_after)
+        files = []
+        files_resource = self.service.files()
+        request = files_resource.list(q=query, fields=self.FORM_FIELDS, pageSize=1000)
+        while request is not None:
+            page = self.executor.execute(request)
+            files.extend(page.get("files", []))
+            request = files_resource.list_next(request, page)
+        # drive matches "name contains" on word prefixes, keep the real prefixes
+        if name_prefix:
+            files = [file for file in files if file["name"].startswith(name_prefix)]
+        logger.info(f"found [{len(files)}] forms with query [{query}]")
+        result = {"files": files}
+        self._forms_cache[key] = result
         return result
 
-    def get_list_of_forms_ids(self) -> list:
-        forms = self.list_forms()
+    def get_start_page_token(self) -> str:
+        """
+        returns the page token of the current end of the drive changes, the
+        changes made from now on are listed from it
+        """
+        result = self.executor.execute(self.service.changes().getStartPageToken())
+        return result["startPageToken"]
+
+    def list_changed_forms(
+        self,
+        pageToken: str,
+        folderId: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        owner: Optional[str] = None,
+        modified_after: Optional[str] = None,
+    ) -> tuple[list, str]:
+        """
+        follows the drive changes from pageToken and returns ([formId, ...],
+        newStartPageToken) with each form that changed since pageToken and
+        still matches the filters of list_forms(), in the order of its last
+        change. The forms removed or trashed since are left out
+
+        input: pageToken, folderId, name_prefix, owner (email), modified_after
+        output: tuple[list, str]
+        """
+        changed_forms: dict[str, dict] = {}
+        changes_resource = self.service.changes()
+        page_token: Optional[str] = pageToken
+        new_start_page_token = pageToken
+        while page_token is not None:
+            page = self.executor.execute(
+                changes_resource.list(
+                    pageToken=page_token, fields=self.CHANGE_FIELDS, pageSize=1000
+                )
+            )
+            for change in page.get("changes", []):
+                file = change.get("file")
+                # a later change of the same form replaces the earlier one
+                changed_forms.pop(change["fileId"], None)
+                if change.get("removed") or file is None or file.get("trashed"):
+                    continue
+                if file.get("mimeType") == self.FORM_MIME_TYPE:
+                    changed_forms[change["fileId"]] = file
+            page_token = page.get("nextPageToken")
+            new_start_page_token = page.get("newStartPageToken", new_start_page_token)
+        formIds = [
+            formId
+            for formId, file in changed_forms.items()
+            if self.__matches_filters(
+                file, folderId, name_prefix, owner, modified_after
+            )
+        ]
+        logger.info(
+            f"[{len(formIds)}] of the [{len(changed_forms)}] changed forms match the "
+            "filters"
+        )
+        return formIds, new_start_page_token
+
+    def get_list_of_forms_ids(self, **filters: Any) -> list:
+        forms = self.list_forms(**filters)
         return [form["id"] for form in forms["files"]]
 
+    def clear_forms_cache(self) -> None:
+        self._forms_cache.clear()
+
+    def __matches_filters(
+        self,
+        file: dict,
+        folderId: Optional[str],
+        name_prefix: Optional[str],
+        owner: Optional[str],
+        modified_after: Optional[str],
+    ) -> bool:
+        """
+        applies the filters of __build_forms_query() to a file resource
+        """
+        owners = [
+            file_owner.get("emailAddress") for file_owner in file.get("owners", [])
+        ]
+        return (
+            (not folderId or folderId in file.get("parents", []))
+            and (not name_prefix or file.get("name", "").startswith(name_prefix))
+            and (not owner or owner in owners)
+            and (not modified_after or file.get("modifiedTime", "") > modified_after)
+        )
+
+    def __build_forms_query(
+        self,
+        folderId: Optional[str],
+        name_prefix: Optional[str],
+        owner: Optional[str],
+        modified_after: Optional[str],
+    ) -> str:
+        def quote(value: str) -> str:
+            return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+        conditions = [f"mimeType = {quote(self.FORM_MIME_TYPE)}", "trashed = false"]
+        if folderId:
+            conditions.append(f"{quote(folderId)} in parents")
+        if name_prefix:
+            conditions.append(f"name contains {quote(name_prefix)}")
+        if owner:
+            conditions.append(f"{quote(owner)} in owners")
+        if modified_after:
+            conditions.append(f"modifiedTime > {quote(modified_after)}")
+        return " and ".join(conditions)
+
     def __delete_all_forms(self) -> dict:
-        forms = self.list_forms()
-        for form in forms["files"]:
-            self.service.files().delete(fileId=form["id"]).execute()
+        forms = self.list_forms(refresh=True)
+        self.delete_many([form["id"] for form in forms["files"]])
         return forms
 
 
 class Sheet_service:
-    def __init__(self, credentials: dict) -> None:
-        self.service = build("sheets", "v4", credentials=credentials)
+    def __init__(
+        self,
+        credentials: Optional["service_account.Credentials"] = None,
+        http: Any = None,
+    ) -> None:
+        self.service = build_service("sheets", "v4", credentials, http)
+        self.executor = request_executors["sheets"]
 
     def get_data_from_sheet(
         self, spreadsheetId: str, range: str, majorDimension: str = "ROWS"
     ) -> dict:
-        result = (
+        result = self.executor.execute(
             self.service.spreadsheets()
             .values()
             .get(
                 spreadsheetId=spreadsheetId, range=range, majorDimension=majorDimension
             )
-            .execute()
         )
         return result
 
+    def get_data_from_sheets(
+        self, spreadsheetId: str, ranges: list, majorDimension: str = "ROWS"
+    ) -> list:
+        """
+        reads all the ranges in a single values.batchGet call and returns
+        their value ranges in the order of ranges
+
+        input: spreadsheetId, ranges, majorDimension
+        attributes used: self.service, self.executor
+        methods used: none
+        output: list
+        """
+        result = self.executor.execute(
+            self.service.spreadsheets()
+            .values()
+            .batchGet(
+                spreadsheetId=spreadsheetId,
+                ranges=ranges,
+                majorDimension=majorDimension,
+            )
+        )
+        return result.get("valueRanges", [])
+
     def get(self, id: str) -> dict:
-        result = self.service.spreadsheets().get(spreadsheetId=id).execute()
+        result = self.executor.execute(
+            self.service.spreadsheets().get(spreadsheetId=id)
+        )
         return result
 
     def list(self) -> dict:
-        result = self.service.spreadsheets().list().execute()
+        result = self.executor.execute(self.service.spreadsheets().list())
         return result
 
 
-# @dataclass()
+_Service = TypeVar(
+    "_Service", Document_service, Form_service, Drive_service, Sheet_service
+)
+
+
+class Client_registry:
+    """
+    keeps one instance of each service class per thread so the credentials
+    are loaded and the service is built only once per thread. httplib2 is not
+    thread-safe so threads must not share a service and its http object. The
+    services are kept on a threading.local, so those of a worker thread are
+    freed with the thread. With an http_factory the services send their
+    requests through the http objects it returns instead of the credentials
+    """
+
+    def __init__(
+        self,
+        credentials_factory: Optional[
+            Callable[[], "service_account.Credentials"]
+        ] = None,
+        http_factory: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        self._credentials_factory = credentials_factory
+        self._http_factory = http_factory
+        self._local = threading.local()
+        # clear() cannot reach the services of the other threads, it starts a
+        # new generation and each thread drops its services when it sees it
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, service_class: type[_Service]) -> _Service:
+        clients = self.__get_thread_clients()
+        if service_class not in clients:
+            with self._lock:
+                if self._http_factory is not None:
+                    client = service_class(http=self._http_factory())
+                else:
+                    client = service_class(self._get_credentials())
+            clients[service_class] = client
+        return clients[service_class]
+
+    def __get_thread_clients(self) -> dict[type, Any]:
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.generation = self._generation
+            self._local.clients = {}
+        return self._local.clients
+
+    def _get_credentials(self) -> "service_account.Credentials":
+        if self._credentials_factory is None:
+            # token.json and the google auth libraries are only loaded by the
+            # first service built
+            from cred import get_shared_credentials
+
+            return get_shared_credentials()
+        return self._credentials_factory()
+
+    def use_http(self, http_factory: Optional[Callable[[], Any]]) -> None:
+        """
+        sends the requests of the services built from now on through the http
+        objects of http_factory, or through the credentials again with None
+        """
+        with self._lock:
+            self._http_factory = http_factory
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+
+
+client_registry = Client_registry()
+
+
+@dataclass(frozen=True)
+class Form_snapshot:
+    """
+    read only copy of a form resource as returned by forms().get() or
+    forms().create()
+    """
+
+    formId: str
+    title: str
+    form_url: str
+    revisionId: str
+    items: list = field(default_factory=list)
+    raw: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_form(cls, form: dict) -> "Form_snapshot":
+        return cls(
+            formId=form["formId"],
+            title=form["info"]["title"],
+            form_url=form["responderUri"],
+            revisionId=form["revisionId"],
+            items=form.get("items", []),
+            raw=form,
+        )
+
+
 class Form_handler:
     def __init__(
         self,
@@ -164,116 +617,358 @@ class Form_handler:
         documentTitle: str = "document form",
         form_service_instance: Optional[Form_service] = None,
         formId: Optional[str] = None,
+        incremental: bool = INCREMENTAL_SYNC,
+        offline: bool = False,
+        store: Optional[Response_store] = None,
+        ranking_strategies: Iterable[str] = DEFAULT_RANKING_STRATEGIES,
+        sink: Optional[Export_sink] = None,
     ) -> None:
-        if not form_service_instance:
-            self.form_service = Form_service(get_credentials())
-        else:
-            self.form_service = form_service_instance
+        self._snapshot: Optional[Form_snapshot] = None
+        # the responses dataframe is kept once built so every export of the
+        # handler works from a single fetch
+        self._responses_df: Optional[pd.DataFrame] = None
+        self.incremental = incremental
+        self.ranking_strategies = list(ranking_strategies)
+        self.sink = sink if sink is not None else Export_sink()
+        # offline handlers read the form and its responses from the local
+        # store only and never call the api
+        self.offline = offline
+        self.store = store if store is not None else response_store
+        # without an instance the form service is taken from the registry on
+        # use, so offline handlers never load the credentials
+        self._form_service = form_service_instance
 
         if formId:
             self.formId = formId
             logger.info(f"form captured with id [{self.formId}]")
         else:
-            NEW_FORM = {
-                "info": {
-                    "title": form_title,
-                    "documentTitle": documentTitle,
-                }
-            }
-            form_object = (
-                self.form_service.service.forms().create(body=NEW_FORM).execute()
-            )
+            form_object = self.form_service.create_empty_form(form_title, documentTitle)
             self.formId = form_object["formId"]
             logger.info(f"form created with id [{self.formId}]")
-
-        self.__post_init__()
-
-    def __post_init__(self) -> None:
-        self.form = self.get()
-        self.form_url = self.get_form_url()
-        self.revisionId = self.get_revisionId()
-        self.form_type = self.get()["info"]["title"]
-        logger.info(f"form name captured/create [{self.form_type}]")
+            # the create call returns the whole form, no need to fetch it again
+            self.__set_snapshot(form_object)
 
     def __repr__(self) -> str:
         return f"Form Object: {str(self.formId)}"
 
+    @property
+    def form_service(self) -> Form_service:
+        if self._form_service is None:
+            return client_registry.get(Form_service)
+        return self._form_service
+
     def delete(self) -> dict:
-        result = self.form_service.service.forms().delete(formId=self.formId).execute()
+        result = self.form_service.execute(
+            self.form_service.service.forms().delete(formId=self.formId)
+        )
         return result
 
     def get(self) -> dict:
-        result = self.form_service.service.forms().get(formId=self.formId).execute()
+        result = self.form_service.get(self.formId)
         return result
 
+    @staticmethod
+    def prefetch(handlers: list["Form_handler"]) -> dict:
+        """
+        fills the snapshots of many handlers with batched forms().get() calls
+        and returns {formId: exception} for the forms that could not be fetched,
+        the handlers are grouped by their form service. Offline handlers read
+        their form from the store and are skipped
+
+        input: handlers
+        output: dict
+        """
+        errors = {}
+        handlers_by_service = defaultdict(list)
+        for handler in handlers:
+            if not handler.offline:
+                handlers_by_service[id(handler.form_service)].append(handler)
+        for service_handlers in handlers_by_service.values():
+            form_service = service_handlers[0].form_service
+            forms, service_errors = form_service.get_many(
+                [handler.formId for handler in service_handlers]
+            )
+            for handler in service_handlers:
+                if handler.formId in forms:
+                    handler.__set_snapshot(forms[handler.formId])
+            errors.update(service_errors)
+        return errors
+
+    @classmethod
+    def from_form_ids(
+        cls, formIds: Iterable[str], **handler_kwargs: Any
+    ) -> dict[str, "Form_handler"]:
+        """
+        returns {formId: Form_handler} with the forms fetched together by
+        cls.prefetch(). A form that could not be fetched in the batch is
+        fetched on its own when its handler is first used. The handlers take
+        their form service from the registry on use, so a handler built here
+        can be used from a worker thread
+
+        input: formIds, handler_kwargs passed to every Form_handler
+        output: dict
+        """
+        handlers = {formId: cls(formId=formId, **handler_kwargs) for formId in formIds}
+        with metrics.stage("fetch_form"):
+            errors = cls.prefetch(list(handlers.values()))
+        if errors:
+            logger.info(
+                f"[{len(errors)}] of [{len(handlers)}] forms were not fetched in "
+                f"a batch and are fetched on their own: {list(errors)}"
+            )
+        return handlers
+
+    def refresh(self) -> Form_snapshot:
+        """
+        fetches the form from the api, or from the local store for offline
+        handlers, and replaces the cached snapshot. The responses dataframe
+        built from the previous snapshot is dropped
+        """
+        self._responses_df = None
+        with metrics.stage("fetch_form"):
+            if self.offline:
+                form = self.store.get_form(self.formId)
+                if form is None:
+                    raise LookupError(
+                        f"form with id [{self.formId}] is not in the local store"
+                    )
+                self._snapshot = Form_snapshot.from_form(form)
+            else:
+                self.__set_snapshot(self.get())
+        logger.info(f"form name captured [{self.snapshot.title}]")
+        return self.snapshot
+
+    def __set_snapshot(self, form: dict) -> None:
+        self._snapshot = Form_snapshot.from_form(form)
+        self.store.save_form(form)
+
+    def invalidate(self) -> None:
+        """
+        drops the cached snapshot and responses dataframe, the next property
+        access fetches the form
+        """
+        self._snapshot = None
+        self._responses_df = None
+
+    @property
+    def snapshot(self) -> Form_snapshot:
+        if self._snapshot is None:
+            return self.refresh()
+        return self._snapshot
+
+    @property
+    def form(self) -> dict:
+        return self.snapshot.raw
+
+    @property
+    def form_url(self) -> str:
+        return self.snapshot.form_url
+
+    @property
+    def revisionId(self) -> str:
+        return self.snapshot.revisionId
+
+    @property
+    def form_type(self) -> str:
+        return self.snapshot.title
+
+    @property
+    def items(self) -> list:
+        return self.snapshot.items
+
     def update_form_title(self, new_form_title: str) -> dict:
-        UPDATE_FORM = {
-            "requests": [
-                {
-                    "updateFormInfo": {
-                        "info": {"title": (new_form_title)},
-                        "updateMask": "title",
-                    }
-                }
-            ]
-        }
-        updated_form = (
-            self.form_service.service.forms()
-            .batchUpdate(formId=self.formId, body=UPDATE_FORM)
-            .execute()
+        UPDATE_FORM = build_requests_list([build_json_for_form_title(new_form_title)])
+        updated_form = self.form_service.execute(
+            self.form_service.service.forms().batchUpdate(
+                formId=self.formId, body=UPDATE_FORM
+            )
         )
-
+        self.invalidate()
         return updated_form
 
     def add_question(self, question: dict) -> dict:
-        question_setting = (
-            self.form_service.service.forms()
-            .batchUpdate(formId=self.formId, body=question)
-            .execute()
+        question_setting = self.form_service.execute(
+            self.form_service.service.forms().batchUpdate(
+                formId=self.formId, body=question
+            )
         )
+        self.invalidate()
         return question_setting
 
     def update_question(self, question: dict) -> dict:
-        question_setting = (
-            self.form_service.service.forms()
-            .batchUpdate(formId=self.formId, body=question)
-            .execute()
+        question_setting = self.form_service.execute(
+            self.form_service.service.forms().batchUpdate(
+                formId=self.formId, body=question
+            )
         )
+        self.invalidate()
         return question_setting
 
     def get_form_url(self) -> str:
-        form_info = self.get()
-        return form_info["responderUri"]
+        return self.form_url
 
     def get_revisionId(self) -> str:
-        form_info = self.get()
-        return form_info["revisionId"]
+        return self.revisionId
 
     def get_responses(self) -> dict:
-        responses = (
-            self.form_service.service.forms()
-            .responses()
-            .list(formId=self.formId)
-            .execute()
+        """
+        returns all the responses of the form in a single dict, following
+        every page of the responses list
+        """
+        responses = [
+            response
+            for page in self.iter_response_pages()
+            for response in page.get("responses", [])
+        ]
+        if not responses:
+            return {}
+        return {"responses": responses}
+
+    def iter_response_pages(
+        self, page_size: int = RESPONSES_PAGE_SIZE, filter: Optional[str] = None
+    ) -> Iterator[dict]:
+        """
+        yields the raw pages of the responses list, following nextPageToken
+        until the last page. filter is passed to the api as is, for example
+        "timestamp > 2024-01-01T00:00:00Z"
+        """
+        responses_resource = self.form_service.service.forms().responses()
+        request = responses_resource.list(
+            formId=self.formId, pageSize=page_size, filter=filter
+        )
+        while request is not None:
+            page = self.form_service.execute(request)
+            yield page
+            request = responses_resource.list_next(request, page)
+
+    def iter_responses(self, page_size: int = RESPONSES_PAGE_SIZE) -> Iterator[dict]:
+        """
+        yields the responses of the form as dicts with the structure of
+        {question01_id: answer01, question02_id: answer02, ...}
+        as the pages arrive
+        """
+        for page in self.iter_response_pages(page_size):
+            for response in page.get("responses", []):
+                yield self.__parse_response(response)
+
+    def sync_responses(self, page_size: int = RESPONSES_PAGE_SIZE) -> list:
+        """
+        fetches only the responses submitted since the last sync and merges
+        them into the responses saved in the local store by the previous runs.
+        All the responses are fetched the first time and whenever the
+        revisionId of the form changed. returns all the raw responses of the
+        form
+
+        input: page_size
+        attributes used: self.formId, self.store
+        methods used: self.iter_response_pages()
+        output: list
+        """
+        # loading the snapshot saves the form to the store, and saving a new
+        # revision of the form drops its stored responses
+        logger.info(f"syncing responses for form [{self.form_type}]")
+        last_submitted_time = self.store.get_last_submitted_time(self.formId)
+        if last_submitted_time is None:
+            logger.info(f"full sync of responses for form with id [{self.formId}]")
+            filter = None
+        else:
+            # >= so responses sharing the high-water timestamp are not lost,
+            # they are saved again over the stored copy
+            filter = f"timestamp >= {last_submitted_time}"
+        number_of_stored_responses = self.store.count_responses(self.formId)
+        for page in self.iter_response_pages(page_size, filter):
+            last_submitted_time = get_latest_time(
+                [
+                    last_submitted_time,
+                    self.store.save_responses(self.formId, page.get("responses", [])),
+                ]
+            )
+        # the high-water mark only moves once every page is saved, a sync
+        # failing part way starts again from the previous one
+        self.store.save_last_submitted_time(self.formId, last_submitted_time)
+        responses = self.store.get_responses(self.formId)
+        logger.info(
+            f"synced [{len(responses) - number_of_stored_responses}] new "
+            f"responses for form with id [{self.formId}], "
+            f"[{len(responses)}] in total"
         )
         return responses
 
+    def __iter_source_pages(
+        self, page_size: int = RESPONSES_PAGE_SIZE
+    ) -> Iterator[dict]:
+        """
+        yields pages of raw responses, from the local store for offline
+        handlers, from the incremental sync when self.incremental is set and
+        straight from the api otherwise. The pages fetched from the api are
+        saved to the local store as they pass
+        """
+        if self.offline or self.incremental:
+            if self.offline:
+                responses = self.store.get_responses(self.formId)
+                if (
+                    responses
+                    and self.store.get_last_submitted_time(self.formId) is None
+                ):
+                    logger.warning(
+                        f"the last sync of the responses for form with id "
+                        f"[{self.formId}] did not complete, the [{len(responses)}] "
+                        f"stored responses may be missing some"
+                    )
+            else:
+                responses = self.sync_responses(page_size)
+            for start in range(0, len(responses), page_size):
+                yield {"responses": responses[start : start + page_size]}
+            return
+        # loading the snapshot saves the form to the store before its responses
+        logger.info(f"fetching responses for form [{self.form_type}]")
+        # clearing the responses also resets the lastSubmittedTime, it stays
+        # None until the last page is saved so an export failing part way is
+        # not taken for a complete sync by the incremental and offline runs
+        self.store.clear_responses(self.formId)
+        last_submitted_time = None
+        for page in self.iter_response_pages(page_size):
+            last_submitted_time = get_latest_time(
+                [
+                    last_submitted_time,
+                    self.store.save_responses(self.formId, page.get("responses", [])),
+                ]
+            )
+            yield page
+        self.store.save_last_submitted_time(self.formId, last_submitted_time)
+
     def create_award_form(
         self,
         group_dataframes_of_applicatants: pd.core.groupby.DataFrameGroupBy,
         form_title: Enum,
-        document_service_instance: Document_service,
+        document_service_instance: Optional[Document_service] = None,
+        award_index: Optional[dict] = None,
     ) -> dict:
+        """
+        sets the title of the form and adds a grid question per candidate of
+        the form type, plus the affiliation and judge name questions. The
+        requests are sent in batchUpdate chunks that stay below the request
+        size limit, see utils.chunk_requests()
+
+        input: group_dataframes_of_applicatants, form_title (Form_Type),
+            document_service_instance, award_index, the index of the criteria
+            document, read from DOCUMENT_ID when not given
+        attributes used: self.formId
+        methods used: self.invalidate()
+        output: dict
+        """
         # build base objects for the form
-        document_content = document_service_instance.get(DOCUMENT_ID)
+        if document_service_instance is None:
+            document_service_instance = client_registry.get(Document_service)
+        if award_index is None:
+            award_index = document_service_instance.get_award_index(DOCUMENT_ID)
         award_enum = convert_form_type_enum_to_award_enum(form_title)
-        critria = document_service_instance.get_award_info(document_content, award_enum)
+        critria = document_service_instance.get_award_info(award_index, award_enum)
 
-        # update the form title
-        self.update_form_title(form_title.value)
+        # update the form title in the first chunk of requests
+        question_json_list = [build_json_for_form_title(form_title.value)]
 
         # build questions list for the form
-        question_json_list = []
         dataframe = group_dataframes_of_applicatants.get_group(
             (award_enum.value[2], form_title.value)
         )
@@ -286,110 +981,180 @@ class Form_handler:
         question_json_list.append(build_json_for_select_question())
         question_json_list.append(build_json_for_text_question())
 
-        self.add_question(build_requests_list(question_json_list))
+        # every question is created at index 0, sending the chunks in order
+        # gives the same form as a single batchUpdate
+        chunks = chunk_requests(question_json_list)
+        for chunk in chunks:
+            self.form_service.execute(
+                self.form_service.service.forms().batchUpdate(
+                    formId=self.formId, body=build_requests_list(chunk)
+                )
+            )
+        logger.info(
+            f"added [{len(question_json_list) - 1}] questions to form "
+            f"[{form_title.value}] in [{len(chunks)}] batchUpdate calls"
+        )
+        self.invalidate()
 
         return self.form
 
-    def __build_default_dict_for_form(self) -> defaultdict:
+    @property
+    def schema(self) -> Form_schema:
         """
-        pull the forms and create a defaultdict[list] with the structure of
-        {attribute_name: [question01_id, question02_id, ...],...}, with the exception of
-        the candidate name which is a list of names. The Judge name and affiliation are
-        repeated lists of the same question id to match the length of the other columns
-
-        input: self
-        attributes used: self.formId
-        methods used: self.form_service.get()
-        output: defaultdict[list]
+        the compiled question index of the current revision of the form, see
+        form_schema.get_form_schema()
         """
-        form_content = self.form_service.get(formId=self.formId)
-        condidates_questions_dict = defaultdict(list)
-        try:
-            for item in form_content["items"]:
-                if "questionGroupItem" not in item.keys():
-                    condidates_questions_dict[item["title"]].append(
-                        item["questionItem"]["question"]["questionId"]
-                    )
-                else:
-                    name_of_candidate = item["title"]
-                    condidates_questions_dict["candidate"].append(name_of_candidate)
-                    for question in item["questionGroupItem"]["questions"]:
-                        condidates_questions_dict[
-                            question["rowQuestion"]["title"]
-                        ].append(question["questionId"])
-            max_length = max(len(v) for v in condidates_questions_dict.values())
-            for key, value in condidates_questions_dict.items():
-                if len(value) < max_length:
-                    condidates_questions_dict[key] *= max_length
-        except KeyError:
+        schema = get_form_schema(self.form)
+        if not schema.columns:
             logger.info(
                 f"No questions yet for form [{self.form_type}] with id [{self.formId}]"
             )
-        return condidates_questions_dict
+        return schema
 
-    def __map_answers_to_questions(
-        self, condidates_questions_dict: dict, response_dict: dict
-    ) -> defaultdict:
+    def __map_answers_to_columns(
+        self, schema: Form_schema, responses_list: list
+    ) -> pd.core.frame.DataFrame:
         """
-        maps answers from a response dict to the questions in
-        condidates_questions_dict and returns a defaultdict[list]
-        with similar structure to condidates_questions_dict but with the answers
-        instead of the question ids
-
-        input: condidates_questions_dict, response_dict
+        maps the answers of all the responses in responses_list to the columns
+        of schema, with one row per response and candidate. Each answer is put
+        at the position its question id has in the schema, the answers of
+        unknown questions are dropped. The score columns, of the grid and
+        scale questions, are SCORE_DTYPE with NaN for missing or non numeric
+        answers. The other columns, such as the judge name or a comment, are
+        categorical, a question asked once per response is repeated through
+        the codes of its answers
+
+        input: schema, responses_list
         attributes used: none
         methods used: none
-        output: defaultdict[list]
-        """
-        mapped_dict = defaultdict(list)
-        for things in condidates_questions_dict.items():
-            key = things[0]
-            value = things[1]
-            if key != "candidate":
-                for value_item in value:
+        output: pd.core.frame.DataFrame
+        """
+        rows_per_response = max(len(schema.candidates), 1)
+        number_of_rows = len(responses_list) * rows_per_response
+        score_arrays = {
+            column_position: np.full(number_of_rows, np.nan, dtype=SCORE_DTYPE)
+            for _, column_position in schema.score_positions.values()
+        }
+        response_values: dict[int, list] = {
+            column_position: [None] * len(responses_list)
+            for column_position in schema.response_columns.values()
+        }
+        for row, response_dict in enumerate(responses_list):
+            first_row = row * rows_per_response
+            for question_id, value in response_dict.items():
+                score_position = schema.score_positions.get(question_id)
+                if score_position is not None:
+                    candidate_position, column_position = score_position
                     try:
-                        mapped_dict[key].append(response_dict[value_item])
-                    except KeyError:
-                        mapped_dict[key].append(np.nan)
+                        score_arrays[column_position][
+                            first_row + candidate_position
+                        ] = float(value)
+                    except ValueError:
+                        pass
+                elif question_id in schema.response_columns:
+                    response_values[schema.response_columns[question_id]][row] = value
+
+        columns: dict = {}
+        for column_position, column in enumerate(schema.columns):
+            if column == "candidate":
+                candidates = pd.Categorical(list(schema.candidates))
+                columns[column] = pd.Categorical.from_codes(
+                    np.tile(candidates.codes, len(responses_list)),
+                    dtype=candidates.dtype,
+                )
+            elif column_position in score_arrays:
+                columns[column] = score_arrays[column_position]
+            elif column_position in schema.scale_columns:
+                scores = pd.to_numeric(
+                    pd.Series(response_values[column_position], dtype="object"),
+                    errors="coerce",
+                ).to_numpy(dtype=SCORE_DTYPE)
+                columns[column] = np.repeat(scores, rows_per_response)
             else:
-                mapped_dict[key] = value
-        return mapped_dict
+                values = pd.Categorical(response_values[column_position])
+                columns[column] = pd.Categorical.from_codes(
+                    np.repeat(values.codes, rows_per_response), dtype=values.dtype
+                )
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def __parse_response(response: dict) -> dict:
+        """
+        turns a response from the api into a dict with the structure of
+        {question01_id: answer01, question02_id: answer02, ...}
+        """
+        answers = response.get("answers", {})
+        return {
+            question_key: answer["textAnswers"]["answers"][0]["value"]
+            for question_key, answer in answers.items()
+        }
 
-    def __build_responses_list_for_form(self) -> list:
+    def __iter_responses_lists_for_form(
+        self, page_size: int = RESPONSES_PAGE_SIZE
+    ) -> Iterator[list]:
         """
-        build a list of responses for a form with the structure of
+        yields a list of responses for each page of responses of the form with
+        the structure of
         [{question01_id: answer01, question02_id: answer02, ...}, ...]
 
-        input: self
-        attributes used: self.formId, self.form_type
-        methods used: self.form_service.get()
-        output: list
+        input: page_size
+        attributes used: self.formId, self.form_type, self.schema
+        methods used: self.__iter_source_pages(), self.__parse_response()
+        output: Iterator[list]
         """
-        response = self.get_responses()
-        if not response:
+        number_of_responses = 0
+        judge_question_id = self.schema.judge_question_id
+        list_of_judge_names: list[str] = []
+        for page in metrics.time_iterator(
+            "fetch_responses", self.__iter_source_pages(page_size)
+        ):
+            responses_list = [
+                self.__parse_response(response)
+                for response in page.get("responses", [])
+            ]
+            if not responses_list:
+                continue
+            number_of_responses += len(responses_list)
+            logger.info(f"got [{len(responses_list)}] responses")
+
+            # get the list of judge names
+            if judge_question_id is not None:
+                list_of_judge_names.extend(
+                    questions_answers_dict[judge_question_id]
+                    for questions_answers_dict in responses_list
+                    if judge_question_id in questions_answers_dict
+                )
+            yield responses_list
+        if not number_of_responses:
             logger.info(
                 f"No responses yet for form [{self.form_type}] with id [{self.formId}]"
             )
-            return []
-        list_of_judge_names = []
-        responses_list = []
-        logger.info(f"got [{len(response['responses'])}] responses")
-        for response in response["responses"]:
-            answers = response["answers"]
-            questions_answers_dict = {}
-            for question_key in list(answers.keys()):
-                answers_text = answers[question_key]["textAnswers"]["answers"][0][
-                    "value"
-                ]
-                questions_answers_dict[question_key] = answers_text
-
-            # get the list of judge names
-            for _, value in questions_answers_dict.items():
-                if value not in ["CAA", "FCDO", "Secretariat"] and not value.isdigit():
-                    list_of_judge_names.append(value)
-            responses_list.append(questions_answers_dict)
         logger.info(f"list_of_judge_names [{list_of_judge_names}]")
-        return responses_list
+
+    def __iter_responses_df_chunks(
+        self, page_size: int = RESPONSES_PAGE_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        """
+        yields a dataframe of responses for each page of responses of the form,
+        the index continues from one chunk to the next. See
+        self.__get_responses_df() for the structure of the dataframes
+
+        input: page_size
+        attributes used: self.schema
+        methods used: self.__iter_responses_lists_for_form(),
+                    self.__map_answers_to_columns()
+        output: Iterator[pd.DataFrame]
+        """
+        schema = self.schema
+        number_of_rows = 0
+        for responses_list in self.__iter_responses_lists_for_form(page_size):
+            with metrics.stage("build_responses_df"):
+                responses_df = self.__map_answers_to_columns(schema, responses_list)
+                responses_df.index += number_of_rows
+                number_of_rows += len(responses_df)
+                # remove empty lines
+                responses_df = self.__remove_empty_lines(responses_df)
+            yield responses_df
 
     def __get_responses_df(self) -> pd.core.frame.DataFrame:
         """
@@ -402,27 +1167,28 @@ class Form_handler:
         Judge 2     | CAA         | candidate1| answer1    | answer2    | ...
         Judge 2     | CAA         | candidate2| answer1    | answer2    | ...
 
+        the dataframe is built on the first call only, with categorical
+        candidate, judge and affiliation columns and SCORE_DTYPE scores
+
         input: self
-        attributes used: none
-        methods used: self.__build_default_dict_for_form(),
-                    self.__build_responses_list_for_form(),
-                    self.__map_answers_to_questions()
+        attributes used: self._responses_df
+        methods used: self.__iter_responses_df_chunks()
         output: pd.core.frame.DataFrame
         """
-        condidates_questions_dict = self.__build_default_dict_for_form()
-        responses_list = self.__build_responses_list_for_form()
-        list_of_dfs = []
-        for response_dict in responses_list:
-            mapped_dict = self.__map_answers_to_questions(
-                condidates_questions_dict, response_dict
+        if self._responses_df is None:
+            list_of_dfs = list(self.__iter_responses_df_chunks())
+            self._responses_df = (
+                compact_responses_df(pd.concat(list_of_dfs))
+                if list_of_dfs
+                else pd.DataFrame()
+            )
+            memory_usage = int(self._responses_df.memory_usage(deep=True).sum())
+            metrics.record_dataframe_bytes(str(self.form_type), memory_usage)
+            logger.info(
+                f"responses of form [{self.form_type}] take [{memory_usage}] bytes "
+                f"for [{len(self._responses_df)}] rows"
             )
-            response_df = pd.DataFrame.from_dict(mapped_dict)
-            list_of_dfs.append(response_df)
-        responses_df = pd.concat(list_of_dfs, ignore_index=True)
-        responses_df_numeric = responses_df.apply(pd.to_numeric, errors="ignore")
-        # remove empty lines
-        responses_df_numeric = self.__remove_empty_lines(responses_df_numeric)
-        return responses_df_numeric
+        return self._responses_df
 
     def __remove_empty_lines(
         self, df: pd.core.frame.DataFrame
@@ -430,11 +1196,7 @@ class Form_handler:
         """
         returns a dataframe without lines of empty scores
         """
-        scores_columns = [
-            column
-            for column in df.columns
-            if column not in ["candidate", "Judge Name", "Affiliation"]
-        ]
+        scores_columns = get_score_columns(df)
         clean_df = df.dropna(subset=scores_columns, how="all")
         logger.info(
             f"removed [{len(df) - len(clean_df)}] empty lines from form [{self.form_type}]"
@@ -444,73 +1206,162 @@ class Form_handler:
     def temp_call(self) -> None:
         self.__get_candidates_by_rank()
 
-    def __get_candidates_by_rank(self) -> pd.core.frame.DataFrame:
-        """ "
-        returns a dataframe with the mean of the answers for each candidate
-        and sorts the candidates based on the score
+    def __get_candidates_by_rank(
+        self, strategies: Optional[Iterable[str]] = None
+    ) -> pd.core.frame.DataFrame:
+        """
+        returns a dataframe with the score and rank of each candidate for each
+        of the ranking strategies, see ranking.rank_candidates()
 
-        input: self
-        attributes used: none
-        methods used: self.__get_responses_df()
+        input: strategies, defaults to self.ranking_strategies
+        attributes used: self.ranking_strategies
+        methods used: self.__get_responses_df(), self.__report_missing_scores()
         output: pd.core.frame.DataFrame
         """
-        candidates_mean_makes_dict = {}
         responses_df = self.__get_responses_df()
-        # group by candidate and calculate the mean of each candidate
-        responses_df_group = responses_df.groupby("candidate")
-        for candidate, df in responses_df_group:
-            self.__report_missing_scores(df)
-            df["mean_per_judge"] = df.mean(axis=1, skipna=True, numeric_only=True)
-            candidates_mean_makes_dict[candidate] = df["mean_per_judge"].mean()
-        candidates_mean_makes_df = pd.DataFrame.from_dict(
-            candidates_mean_makes_dict, orient="index"
+        self.__report_missing_scores(responses_df)
+        with metrics.stage("ranking"):
+            return rank_candidates(responses_df, strategies or self.ranking_strategies)
+
+    def __report_missing_scores(self, df: pd.core.frame.DataFrame) -> None:
+        """
+        logs a summary of the missing scores of the form, the full list is
+        written by self.export_missing_scores_report()
+        """
+        if df.empty:
+            return
+        candidates = self.schema.candidates
+        report = build_missing_scores_report(get_missing_matrix(df, candidates))
+        logger.info(
+            f"[{report['expected'] - report['answered']}] of [{report['expected']}] "
+            f"scores are missing in form [{self.form_type}] with id [{self.formId}]"
         )
 
-        candidates_mean_makes_df.sort_values(by=0, ascending=False, inplace=True)
-        return candidates_mean_makes_df
+    def __get_missing_matrix(self) -> pd.core.frame.DataFrame:
+        """
+        returns the judge x candidate x criterion missing scores matrix of the
+        form, see audit.get_missing_matrix()
 
-    def __report_missing_scores(self, df: pd.core.frame.DataFrame) -> None:
-        if df.isnull().values.any():
-            null_df = df[df.isnull().any(axis=1)]
-            for _, row in null_df.iterrows():
-                judge_name = row["Judge Name"]
-                candidate_name = row["candidate"]
-                columns_with_null = [
-                    key for key, value in row.items() if value != value
-                ]
-                logger.info(
-                    f"candidate [{candidate_name}] has missing answers [{columns_with_null}] for judge [{judge_name}] in form [{self.form_type}] with id [{self.formId}]"
-                )
+        input: self
+        attributes used: none
+        methods used: self.__get_responses_df()
+        output: pd.core.frame.DataFrame
+        """
+        responses_df = self.__get_responses_df()
+        if responses_df.empty:
+            return pd.DataFrame()
+        candidates = self.schema.candidates
+        with metrics.stage("audit"):
+            return get_missing_matrix(responses_df, candidates)
 
     def __save_dataframes_to_csv(
         self, df: pd.core.frame.DataFrame, df_type: str = "responses"
-    ) -> None:
+    ) -> pathlib.Path:
         """
-        saves a dataframe to a csv file with the name
-        [df_type]_[date]_[form_type].csv
+        saves a dataframe through self.sink, as a csv file by default, with
+        the name [df_type]_[date]_[form_type].csv
 
         input: df, df_type
-        attributes used: self.form_type
+        attributes used: self.form_type, self.sink
         methods used: none
-        output: none
+        output: pathlib.Path
         """
-        current_file_path = pathlib.Path(__file__).parent.absolute()
-        file_name = (
-            df_type
-            + "_"
-            + str(datetime.now().isoformat()).replace(":", "_")
-            + "_"
-            + str(self.form_type)
-            + ".csv"
-        )
-        df.to_csv(current_file_path / "data" / file_name)
+        with metrics.stage(f"write_{df_type}"):
+            return self.sink.save(df, df_type, self.form_type)
 
     def export_all_responses_to_csv(self) -> None:
-        responses_df = self.__get_responses_df()
-        if responses_df is not None:
-            self.__save_dataframes_to_csv(responses_df, "responses")
-
-    def export_candidates_ranking_to_csv(self) -> None:
-        candidates_mean_makes_df = self.__get_candidates_by_rank()
+        if self._responses_df is not None:
+            self.__save_dataframes_to_csv(self._responses_df, "responses")
+            return
+        # write each page of responses as it arrives, the file only gets its
+        # final name once all the pages are written
+        writer = None
+        try:
+            for responses_df in self.__iter_responses_df_chunks():
+                with metrics.stage("write_responses"):
+                    if writer is None:
+                        writer = self.sink.open("responses", self.form_type)
+                    writer.write(responses_df)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            with metrics.stage("write_responses"):
+                writer.commit()
+
+    def export_candidates_ranking_to_csv(
+        self, strategies: Optional[Iterable[str]] = None
+    ) -> None:
+        candidates_mean_makes_df = self.__get_candidates_by_rank(strategies)
         if candidates_mean_makes_df is not None:
             self.__save_dataframes_to_csv(candidates_mean_makes_df, "rank")
+
+    def get_responses_df(self) -> pd.core.frame.DataFrame:
+        """
+        returns the cached responses dataframe of the form, see
+        self.__get_responses_df()
+        """
+        return self.__get_responses_df()
+
+    def get_candidates_ranking(
+        self, strategies: Optional[Iterable[str]] = None
+    ) -> pd.core.frame.DataFrame:
+        """
+        returns the ranking of the candidates from the cached responses
+        dataframe, see self.__get_candidates_by_rank()
+        """
+        return self.__get_candidates_by_rank(strategies)
+
+    def get_completion_report(self) -> dict:
+        """
+        returns the completion rates of the form, see
+        audit.build_missing_scores_report(), {} when there are no scores
+        """
+        missing_matrix = self.__get_missing_matrix()
+        if missing_matrix.empty:
+            return {}
+        return build_missing_scores_report(missing_matrix)
+
+    def export_missing_scores_report(self) -> None:
+        """
+        saves the missing scores of the form as a csv with one row per
+        missing score and a json report with the completion rates per judge
+        and per candidate
+        """
+        missing_matrix = self.__get_missing_matrix()
+        if missing_matrix.empty:
+            logger.info(f"No scores to audit in form [{self.form_type}]")
+            return
+        self.__save_dataframes_to_csv(get_missing_scores(missing_matrix), "missing")
+        report = {
+            "formId": self.formId,
+            "form_type": self.form_type,
+            **build_missing_scores_report(missing_matrix),
+        }
+        with metrics.stage("write_audit"):
+            self.sink.save_json(report, "audit", self.form_type)
+
+    def export(self, stages: Optional[Iterable[str]] = None) -> None:
+        """
+        fetches the form and its responses once and writes the output of
+        each stage in EXPORT_STAGES from the same dataframe, all of them by
+        default
+
+        input: stages
+        attributes used: none
+        methods used: self.__get_responses_df()
+        output: none
+        """
+        self.__get_responses_df()
+        for stage in EXPORT_STAGES if stages is None else stages:
+            EXPORT_STAGES[stage](self)
+
+
+# the outputs of Form_handler.export(), a stage is any callable taking the
+# handler and can add new outputs from the same responses
+EXPORT_STAGES: dict[str, Callable[[Form_handler], None]] = {
+    "responses": Form_handler.export_all_responses_to_csv,
+    "ranking": Form_handler.export_candidates_ranking_to_csv,
+    "missing_scores": Form_handler.export_missing_scores_report,
+}
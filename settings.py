@@ -9,11 +9,80 @@ if Path("local_settings.py").exists():
 current_folder_path = Path(__file__).parent
 
 
+def get_flag(name: str, default: bool = False) -> bool:
+    """
+    reads an on/off setting, "1", "true" and "yes" turn it on and any other
+    value, "0" and "false" included, turns it off
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
 SPREADSHEET_ID = os.environ.get("SPREADSHEET_ID", default="example spreadsheetId")
 RANGE = os.environ.get("RANGE", default="example range")
+# the ranges of the nominations, read with a single batchGet. Separated by ";"
+# as sheet names may contain commas, each range starts with its header row
+RANGES = os.environ.get("RANGES", default=RANGE).split(";")
 MAJOR_DIMENSION = os.environ.get("MAJOR_DIMENSION", default="ROWS")
 DOCUMENT_ID = os.environ.get("DOCUMENT_ID", default="example documentId")
 LOG_DIRECTORY_PATH = Path(
     os.environ.get("DATA_DIRECTORY_PATH", default=current_folder_path / "logs")
 )
 DEBUG = os.environ.get("DEBUG", default=False)
+RESPONSES_PAGE_SIZE = int(os.environ.get("RESPONSES_PAGE_SIZE", default=1000))
+FORMS_FOLDER_ID = os.environ.get("FORMS_FOLDER_ID")
+FORMS_NAME_PREFIX = os.environ.get("FORMS_NAME_PREFIX")
+FORMS_OWNER = os.environ.get("FORMS_OWNER")
+FORMS_MODIFIED_AFTER = os.environ.get("FORMS_MODIFIED_AFTER")
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", default=4))
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", default=100))
+CACHE_DIRECTORY_PATH = Path(
+    os.environ.get("CACHE_DIRECTORY_PATH", default=current_folder_path / "cache")
+)
+INCREMENTAL_SYNC = get_flag("INCREMENTAL_SYNC")
+STORE_PATH = Path(
+    os.environ.get("STORE_PATH", default=CACHE_DIRECTORY_PATH / "caa_forms.sqlite3")
+)
+DOCUMENT_INDEX_DIRECTORY_PATH = Path(
+    os.environ.get(
+        "DOCUMENT_INDEX_DIRECTORY_PATH", default=CACHE_DIRECTORY_PATH / "documents"
+    )
+)
+FORM_SCHEMA_DIRECTORY_PATH = Path(
+    os.environ.get(
+        "FORM_SCHEMA_DIRECTORY_PATH", default=CACHE_DIRECTORY_PATH / "schemas"
+    )
+)
+DEFAULT_RANKING_STRATEGIES = os.environ.get(
+    "DEFAULT_RANKING_STRATEGIES", default="mean"
+).split(",")
+TRIM_PROPORTION = float(os.environ.get("TRIM_PROPORTION", default=0.1))
+OUTPUT_DIRECTORY_PATH = Path(
+    os.environ.get("OUTPUT_DIRECTORY_PATH", default=current_folder_path / "data")
+)
+EXPORT_FORMAT = os.environ.get("EXPORT_FORMAT", default="csv")
+EXPORT_COMPRESSION = os.environ.get("EXPORT_COMPRESSION")
+# per minute quotas of a single user, the service account, of each api
+FORMS_REQUESTS_PER_MINUTE = float(os.environ.get("FORMS_REQUESTS_PER_MINUTE", 390))
+DRIVE_REQUESTS_PER_MINUTE = float(os.environ.get("DRIVE_REQUESTS_PER_MINUTE", 12000))
+SHEETS_REQUESTS_PER_MINUTE = float(os.environ.get("SHEETS_REQUESTS_PER_MINUTE", 60))
+DOCS_REQUESTS_PER_MINUTE = float(os.environ.get("DOCS_REQUESTS_PER_MINUTE", 300))
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", default=8))
+MAX_RETRIES = int(os.environ.get("MAX_RETRIES", default=6))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", default=1))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", default=64))
+METRICS_PATH = os.environ.get("METRICS_PATH")
+PROFILE_PATH = os.environ.get("PROFILE_PATH")
+TRACE_MEMORY = get_flag("TRACE_MEMORY")
+# the requests of a batchUpdate are sent in chunks below the request size limit
+BATCH_UPDATE_MAX_REQUESTS = int(os.environ.get("BATCH_UPDATE_MAX_REQUESTS", 50))
+BATCH_UPDATE_MAX_BYTES = int(os.environ.get("BATCH_UPDATE_MAX_BYTES", 1_000_000))
+# the watch action polls every WATCH_MIN_INTERVAL seconds while responses
+# arrive, twice as long after each idle poll up to WATCH_MAX_INTERVAL, and
+# serves the rankings on WATCH_HOST:WATCH_PORT
+WATCH_MIN_INTERVAL = float(os.environ.get("WATCH_MIN_INTERVAL", default=15))
+WATCH_MAX_INTERVAL = float(os.environ.get("WATCH_MAX_INTERVAL", default=300))
+WATCH_HOST = os.environ.get("WATCH_HOST", default="127.0.0.1")
+WATCH_PORT = int(os.environ.get("WATCH_PORT", default=8000))
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+# the settings are read when the modules are imported, the logs, caches and
+# exports of the tests go to a temporary directory
+_TEST_DIRECTORY = Path(tempfile.mkdtemp(prefix="caa_forms_tests_"))
+for name in ["DATA_DIRECTORY_PATH", "CACHE_DIRECTORY_PATH", "OUTPUT_DIRECTORY_PATH"]:
+    os.environ[name] = str(_TEST_DIRECTORY / name.lower())
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+
+from fake_google import Fake_google  # noqa: E402
+from response_store import Response_store  # noqa: E402
+from service_template import client_registry  # noqa: E402
+from utils import compact_responses_df  # noqa: E402
+
+
+@pytest.fixture
+def fake() -> Iterator[Fake_google]:
+    """
+    an in memory google backend with 2 forms of 4 judges and 3 candidates,
+    the services of the registry send their requests to it
+    """
+    fake = Fake_google.with_forms(2, 4, 3)
+    client_registry.use_http(fake.http)
+    yield fake
+    client_registry.use_http(None)
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Response_store:
+    return Response_store(tmp_path / "caa_forms.sqlite3")
+
+
+@pytest.fixture
+def build_responses_df() -> Callable[[dict], pd.DataFrame]:
+    """
+    returns a function building a responses dataframe from
+    {(judge, candidate): [score, ...]} with a score column per criterion
+    """
+
+    def build(scores: dict) -> pd.DataFrame:
+        rows = [
+            {
+                "Judge Name": judge,
+                "Affiliation": "CAA",
+                "candidate": candidate,
+                **{f"Criterion {index}": score for index, score in enumerate(values)},
+            }
+            for (judge, candidate), values in scores.items()
+        ]
+        return compact_responses_df(pd.DataFrame(rows))
+
+    return build
@@ -0,0 +1,84 @@
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggregate import (
+    CONSOLIDATED_NAME,
+    concat_responses_dfs,
+    export_consolidated,
+    get_category_completion,
+    get_judge_workload,
+)
+from export_sink import Export_sink
+from fake_google import Fake_google
+from ranking import rank_candidates
+from response_store import Response_store
+
+
+def test_concat_tags_the_rows_of_each_form(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    consolidated_df = concat_responses_dfs(
+        {
+            "form1": ("Award 1", build_responses_df({("Judge 1", "A"): [7.0]})),
+            "form2": (
+                "Award 2",
+                build_responses_df({("Judge 1", "B"): [5.0, 6.0]}),
+            ),
+            "form3": ("Award 3", build_responses_df({})),
+        }
+    )
+    assert consolidated_df.columns[:2].tolist() == ["formId", "category"]
+    assert consolidated_df["formId"].tolist() == ["form1", "form2"]
+    assert consolidated_df["category"].tolist() == ["Award 1", "Award 2"]
+    assert isinstance(consolidated_df["formId"].dtype, pd.CategoricalDtype)
+    # a criterion form1 does not ask is missing in its rows
+    assert np.isnan(consolidated_df.loc[0, "Criterion 1"])
+
+
+def test_workload_counts_a_resubmission_once(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    responses_df = build_responses_df(
+        {("Judge 1", "A"): [7.0, np.nan], ("Judge 2", "A"): [5.0, 5.0]}
+    )
+    resubmitted = build_responses_df({("Judge 1", "A"): [7.0, 8.0]})
+    consolidated_df = concat_responses_dfs(
+        {"form1": ("Award 1", pd.concat([responses_df, resubmitted]))}
+    )
+    forms_df = pd.DataFrame(
+        {"candidates": [2], "criteria": [2]}, index=pd.Index(["form1"], name="formId")
+    )
+    workload = get_judge_workload(consolidated_df, forms_df).set_index("judge")
+    assert workload.loc["Judge 1", "candidates"] == 1
+    assert workload.loc["Judge 1", "answered"] == 2
+    assert workload.loc["Judge 1", "expected"] == 4
+    completion = get_category_completion(workload.reset_index())
+    assert completion.loc[0, "completion_rate"] == 0.5
+
+
+def test_export_consolidated_writes_every_form_once(
+    fake: Fake_google, store: Response_store, tmp_path: Path
+) -> None:
+    sink = Export_sink(tmp_path)
+    errors = export_consolidated(
+        ["form0000", "form0001"], handler_kwargs={"store": store, "sink": sink}
+    )
+    assert errors == {}
+    calls = fake.reset_calls()
+    assert calls["forms.get"] == calls["forms.responses.list"] == 2
+    assert calls["batch"] == 1
+
+    responses_df = pd.read_csv(tmp_path / f"responses_{CONSOLIDATED_NAME}_latest.csv")
+    assert len(responses_df) == 2 * 4 * 3
+    report = json.loads(
+        (tmp_path / f"consolidated_{CONSOLIDATED_NAME}_latest.json").read_text()
+    )
+    assert report["responses"] == len(responses_df)
+    assert [form["formId"] for form in report["forms"]] == ["form0000", "form0001"]
+    ranking = pd.DataFrame(report["ranking"])
+    assert set(ranking["formId"]) == {"form0000", "form0001"}
+    assert len(ranking) == len(rank_candidates(responses_df, ["mean"], ["formId"]))
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from atomic_file import replacing, write_json
+
+
+def test_write_json_replaces_the_file(tmp_path: Path) -> None:
+    path = tmp_path / "cache" / "index.json"
+    write_json(path, {"a": 1})
+    write_json(path, {"a": 2}, indent=2)
+    assert path.read_text() == '{\n  "a": 2\n}'
+    assert [child.name for child in path.parent.iterdir()] == ["index.json"]
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path: Path) -> None:
+    path = tmp_path / "index.json"
+    write_json(path, {"a": 1})
+    with pytest.raises(RuntimeError):
+        with replacing(path) as temporary_path:
+            temporary_path.write_text("{")
+            raise RuntimeError("failed write")
+    assert path.read_text() == '{"a": 1}'
+    assert [child.name for child in tmp_path.iterdir()] == ["index.json"]
@@ -0,0 +1,56 @@
+from collections.abc import Callable
+
+import numpy as np
+import pandas as pd
+
+from audit import (
+    build_missing_scores_report,
+    get_completion_rates,
+    get_missing_matrix,
+    get_missing_scores,
+)
+
+SCORES = {
+    ("Judge 1", "A"): [7.0, 8.0],
+    ("Judge 1", "B"): [6.0, np.nan],
+    ("Judge 2", "A"): [5.0, 5.0],
+}
+
+
+def test_missing_matrix_reports_unscored_candidates(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    missing_matrix = get_missing_matrix(build_responses_df(SCORES), ["A", "B", "C"])
+    assert missing_matrix.shape == (6, 2)
+    missing = get_missing_scores(missing_matrix)
+    assert set(map(tuple, missing.to_numpy())) == {
+        ("Judge 1", "B", "Criterion 1"),
+        ("Judge 1", "C", "Criterion 0"),
+        ("Judge 1", "C", "Criterion 1"),
+        ("Judge 2", "B", "Criterion 0"),
+        ("Judge 2", "B", "Criterion 1"),
+        ("Judge 2", "C", "Criterion 0"),
+        ("Judge 2", "C", "Criterion 1"),
+    }
+
+
+def test_missing_matrix_keeps_the_last_submission(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    responses_df = build_responses_df(SCORES)
+    resubmitted = build_responses_df({("Judge 1", "B"): [6.0, 4.0]})
+    missing_matrix = get_missing_matrix(
+        pd.concat([responses_df, resubmitted], ignore_index=True)
+    )
+    assert not missing_matrix.loc[("Judge 1", "B")].any()
+
+
+def test_completion_rates(build_responses_df: Callable[[dict], pd.DataFrame]) -> None:
+    missing_matrix = get_missing_matrix(build_responses_df(SCORES), ["A", "B"])
+    rates = get_completion_rates(missing_matrix, "judge").set_index("judge")
+    assert rates.loc["Judge 1", "expected"] == 4
+    assert rates.loc["Judge 1", "answered"] == 3
+    assert rates.loc["Judge 2", "completion_rate"] == 0.5
+    report = build_missing_scores_report(missing_matrix)
+    assert (report["expected"], report["answered"]) == (8, 5)
+    assert len(report["missing"]) == 3
@@ -0,0 +1,33 @@
+import pytest
+
+import response_store
+from fake_google import Fake_google, generate_form
+from main import get_changed_forms_ids, save_page_token
+from response_store import Response_store
+
+
+def test_changes_return_only_the_forms_changed_since_the_last_run(
+    fake: Fake_google, store: Response_store, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(response_store, "response_store", store)
+    # the first run processes every form
+    forms_ids, page_token = get_changed_forms_ids({})
+    assert sorted(forms_ids) == ["form0000", "form0001"]
+    save_page_token({}, page_token, {})
+
+    forms_ids, page_token = get_changed_forms_ids({})
+    assert forms_ids == []
+    save_page_token({}, page_token, {})
+
+    _, responses = generate_form("form0001", "Award 0001", 1, 3, seed=9)
+    responses[0]["responseId"] += "-new"
+    fake.add_responses("form0001", responses)
+    forms_ids, page_token = get_changed_forms_ids({})
+    assert forms_ids == ["form0001"]
+    # the token is kept when a form failed, the next run processes it again
+    save_page_token({}, page_token, {"form0001": RuntimeError("failed")})
+    assert get_changed_forms_ids({})[0] == ["form0001"]
+
+    # other filters keep a token of their own
+    forms_ids, _ = get_changed_forms_ids({"name_prefix": "Award"})
+    assert sorted(forms_ids) == ["form0000", "form0001"]
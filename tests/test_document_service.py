@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+import service_template
+from fake_google import Fake_google, generate_award_document
+from service_template import Document_service
+
+
+def test_award_index_is_cached_by_revision(
+    fake: Fake_google, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(service_template, "_award_indexes", {})
+    document = generate_award_document()
+    fake.documents["document1"] = document
+    service = Document_service(http=fake.http(), index_directory=tmp_path)
+    award_index = service.get_award_index("document1")
+    assert award_index == service.build_award_index(document)
+    assert "Project award" in award_index
+    assert fake.reset_calls()["docs.documents.get"] == 2
+    assert [path.name for path in tmp_path.iterdir()] == [
+        "document1_revision000001.json"
+    ]
+
+    # read back from the file by a new process, only the revisionId is fetched
+    monkeypatch.setattr(service_template, "_award_indexes", {})
+    assert service.get_award_index("document1") == award_index
+    assert fake.reset_calls()["docs.documents.get"] == 1
+
+    document["revisionId"] = "revision000002"
+    service.get_award_index("document1")
+    assert fake.reset_calls()["docs.documents.get"] == 2
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from export_sink import Export_sink
+
+READERS = {"csv": pd.read_csv, "parquet": pd.read_parquet, "feather": pd.read_feather}
+
+
+def _page(first_judge: int, number_of_judges: int, comments: bool) -> pd.DataFrame:
+    """
+    a page of 200 responses as the form handler streams them, with an
+    optional text question
+    """
+    rows = range(200)
+    return pd.DataFrame(
+        {
+            "Judge Name": pd.Categorical(
+                [f"Judge {first_judge + row % number_of_judges}" for row in rows]
+            ),
+            "candidate": pd.Categorical([f"candidate{row % 3}" for row in rows]),
+            "Comment": pd.Categorical(
+                [f"note {row}" if comments else None for row in rows]
+            ),
+            "Criterion 0": np.arange(200, dtype="float32"),
+        }
+    )
+
+
+@pytest.mark.parametrize("format", ["csv", "parquet", "feather"])
+def test_pages_with_new_categories_are_streamed(tmp_path: Path, format: str) -> None:
+    # the second page has more judges than int8 codes can hold and the first
+    # page has no answer to the text question
+    pages = [_page(0, 5, comments=False), _page(5, 200, comments=True)]
+    writer = Export_sink(tmp_path, format).open("responses", "Award 1")
+    for page in pages:
+        writer.write(page)
+    path = writer.commit()
+
+    df = READERS[format](path)
+    assert len(df) == 400
+    assert df["Judge Name"].nunique() == 205
+    assert df["Comment"].notna().sum() == 200
+    if format != "csv":
+        assert isinstance(df["Judge Name"].dtype, pd.CategoricalDtype)
+    latest_path = tmp_path / f"responses_Award 1_latest{path.suffix}"
+    assert latest_path.read_bytes() == path.read_bytes()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.parametrize(
+    "format, compression",
+    [("csv", "zstd"), ("parquet", "xz"), ("feather", "gzip"), ("feather", "snappy")],
+)
+def test_unknown_compressions_are_refused_upfront(
+    tmp_path: Path, format: str, compression: str
+) -> None:
+    with pytest.raises(ValueError, match=f"unknown {format} compression"):
+        Export_sink(tmp_path, format, compression)
+
+
+@pytest.mark.parametrize(
+    "format, compression",
+    [("csv", "gzip"), ("parquet", "zstd"), ("feather", "lz4"), ("feather", None)],
+)
+def test_known_compressions_are_written(
+    tmp_path: Path, format: str, compression: str
+) -> None:
+    page = _page(0, 5, comments=True)
+    path = Export_sink(tmp_path, format, compression).save(page, "responses", "x")
+    assert len(READERS[format](path)) == len(page)
@@ -0,0 +1,128 @@
+import pandas as pd
+import pytest
+from googleapiclient.errors import HttpError
+
+from fake_google import Fake_error, Fake_google, generate_form
+from response_store import Response_store
+from service_template import Form_handler
+
+
+def test_export_fetches_the_form_once(fake: Fake_google, store: Response_store) -> None:
+    handler = Form_handler(formId="form0000", store=store)
+    handler.get_candidates_ranking()
+    handler.get_completion_report()
+    assert fake.reset_calls() == {
+        "http": 2,
+        "forms.get": 1,
+        "forms.responses.list": 1,
+    }
+
+
+def test_from_form_ids_fetches_the_forms_in_one_batch(
+    fake: Fake_google, store: Response_store
+) -> None:
+    handlers = Form_handler.from_form_ids(["form0000", "form0001"], store=store)
+    assert [handler.form_type for handler in handlers.values()] == [
+        "Award 0000",
+        "Award 0001",
+    ]
+    calls = fake.reset_calls()
+    assert calls["http"] == 1
+    assert calls["forms.get"] == 2
+
+
+def test_incremental_resync_asks_only_for_new_responses(
+    fake: Fake_google, store: Response_store, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    first = Form_handler(formId="form0000", incremental=True, store=store)
+    responses_df = first.get_responses_df()
+    fake.reset_calls()
+    listed = []
+    list_responses = fake._list_responses
+
+    def spy_list_responses(formId: str, query: dict) -> dict:
+        result = list_responses(formId, query)
+        listed.append((query.get("filter"), len(result.get("responses", []))))
+        return result
+
+    monkeypatch.setattr(fake, "_list_responses", spy_list_responses)
+
+    resync = Form_handler(formId="form0000", incremental=True, store=store)
+    pd.testing.assert_frame_equal(resync.get_responses_df(), responses_df)
+    calls = fake.reset_calls()
+    assert calls["http"] == 2
+    assert calls["forms.get"] == calls["forms.responses.list"] == 1
+    # only the responses submitted since the last sync are sent again
+    [(filter, number_of_responses)] = listed
+    assert filter is not None and filter.startswith("timestamp")
+    assert number_of_responses < len(fake.responses["form0000"])
+
+    _, new_responses = generate_form("form0000", "Award 0000", 1, 3, seed=9)
+    for response in new_responses:
+        response["responseId"] += "-new"
+        response["lastSubmittedTime"] = "2030-01-01T00:00:00Z"
+    fake.add_responses("form0000", new_responses)
+    updated = Form_handler(formId="form0000", incremental=True, store=store)
+    assert len(updated.get_responses_df()) == len(responses_df) + 3
+
+
+def test_failed_sync_does_not_move_the_last_submitted_time(
+    fake: Fake_google, store: Response_store, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, responses = generate_form("form0000", "Award 0000", 6, 3)
+    # newest first, so the first page holds the latest submissions
+    for day, response in zip(range(6, 0, -1), responses):
+        response["lastSubmittedTime"] = f"2024-01-0{day}T00:00:00Z"
+    fake.responses["form0000"] = responses
+    list_responses = fake._list_responses
+
+    def fail_on_second_page(formId: str, query: dict) -> dict:
+        if query.get("pageToken") == "2":
+            raise Fake_error(400, "failed page")
+        return list_responses(formId, query)
+
+    monkeypatch.setattr(fake, "_list_responses", fail_on_second_page)
+    handler = Form_handler(formId="form0000", incremental=True, store=store)
+    with pytest.raises(HttpError):
+        handler.sync_responses(page_size=2)
+    assert store.get_last_submitted_time("form0000") is None
+
+    monkeypatch.setattr(fake, "_list_responses", list_responses)
+    resync = Form_handler(formId="form0000", incremental=True, store=store)
+    assert len(resync.sync_responses(page_size=2)) == 6
+    assert store.get_last_submitted_time("form0000") == "2024-01-06T00:00:00Z"
+
+
+def test_offline_handler_makes_no_api_call(
+    fake: Fake_google, store: Response_store
+) -> None:
+    online_df = Form_handler(formId="form0001", store=store).get_responses_df()
+    fake.reset_calls()
+    offline = Form_handler(formId="form0001", offline=True, store=store)
+    pd.testing.assert_frame_equal(offline.get_responses_df(), online_df)
+    assert offline.form_type == "Award 0001"
+    assert fake.reset_calls() == {}
+
+
+def test_failed_export_is_not_taken_for_a_complete_sync(
+    fake: Fake_google, store: Response_store, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    Form_handler(formId="form0000", store=store).get_responses_df()
+    assert store.get_last_submitted_time("form0000") is not None
+    list_responses = fake._list_responses
+
+    def fail_on_second_page(formId: str, query: dict) -> dict:
+        if query.get("pageToken") == "2":
+            raise Fake_error(400, "failed page")
+        return list_responses(formId, {**query, "pageSize": 2})
+
+    monkeypatch.setattr(fake, "_list_responses", fail_on_second_page)
+    with pytest.raises(HttpError):
+        Form_handler(formId="form0000", store=store).get_responses_df()
+    assert store.count_responses("form0000") == 2
+    assert store.get_last_submitted_time("form0000") is None
+
+    # the incremental run that follows syncs every response again
+    monkeypatch.setattr(fake, "_list_responses", list_responses)
+    resync = Form_handler(formId="form0000", incremental=True, store=store)
+    assert len(resync.sync_responses()) == len(fake.responses["form0000"])
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+import form_schema
+from fake_google import DEFAULT_CRITERIA, generate_form
+from form_schema import Form_schema, get_form_schema
+
+
+def _form_with_a_scale_question() -> dict:
+    form, _ = generate_form("form1", "Award 1", 2, 3)
+    form["items"].append(
+        {
+            "itemId": "overall",
+            "title": "Overall",
+            "questionItem": {
+                "question": {"questionId": "overall", "scaleQuestion": {"high": 10}}
+            },
+        }
+    )
+    return form
+
+
+def test_schema_indexes_the_questions_of_the_form() -> None:
+    schema = Form_schema.from_form(_form_with_a_scale_question())
+    assert schema.columns == (
+        "Judge Name",
+        "Affiliation",
+        "candidate",
+        *DEFAULT_CRITERIA,
+        "Overall",
+    )
+    assert schema.candidates == ("Candidate 000", "Candidate 001", "Candidate 002")
+    assert schema.score_positions["c2q1"] == (2, 4)
+    assert schema.response_columns["judge"] == 0
+    assert schema.judge_question_id == "judge"
+    assert schema.score_columns == (*DEFAULT_CRITERIA, "Overall")
+    assert Form_schema.from_dict(schema.to_dict()).to_dict() == schema.to_dict()
+    with pytest.raises(AttributeError):
+        schema.columns = ()
+
+
+def test_schema_is_cached_by_revision(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(form_schema, "_form_schemas", {})
+    form = _form_with_a_scale_question()
+    schema = get_form_schema(form, tmp_path)
+    assert get_form_schema(form, tmp_path) is schema
+    assert [path.name for path in tmp_path.iterdir()] == ["form1_00000001.json"]
+
+    def build_again(form: dict) -> Form_schema:
+        raise AssertionError("the schema was built again")
+
+    # a new process reads the schema back from the file
+    monkeypatch.setattr(form_schema, "_form_schemas", {})
+    with monkeypatch.context() as patch:
+        patch.setattr(Form_schema, "from_form", build_again)
+        assert get_form_schema(form, tmp_path).to_dict() == schema.to_dict()
+
+    monkeypatch.setattr(form_schema, "_form_schemas", {})
+    edited = {**form, "revisionId": "00000002", "items": form["items"][:-1]}
+    edited_schema = get_form_schema(edited, tmp_path)
+    assert edited_schema.revisionId == "00000002"
+    assert "Overall" not in edited_schema.columns
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,94 @@
+from collections.abc import Callable
+
+import pandas as pd
+import pytest
+
+from ranking import rank_candidates, trimmed_mean_of_judge_means, get_judge_scores
+
+# four judges prefer B, the fifth is harsh on B, so the mean prefers A while
+# the strategies robust to one judge prefer B
+SCORES = {
+    **{(f"Judge {judge}", "A"): [7.0, 7.0] for judge in range(1, 6)},
+    **{(f"Judge {judge}", "B"): [8.0, 8.0] for judge in range(1, 5)},
+    ("Judge 5", "B"): [1.0, 1.0],
+}
+
+
+@pytest.mark.parametrize(
+    "strategy, expected_order",
+    [
+        ("mean", ["A", "B"]),
+        ("median", ["B", "A"]),
+        # 10% of 5 judges trims none of them
+        ("trimmed_mean", ["A", "B"]),
+        ("zscore", ["B", "A"]),
+    ],
+)
+def test_rank_candidates_order(
+    strategy: str,
+    expected_order: list,
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    ranking = rank_candidates(build_responses_df(SCORES), [strategy])
+    assert ranking["candidate"].tolist() == expected_order
+    assert ranking["rank"].tolist() == [1, 2]
+    assert (ranking["strategy"] == strategy).all()
+
+
+def test_rank_candidates_scores(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    ranking = rank_candidates(build_responses_df(SCORES), ["mean", "median"])
+    scores = ranking.set_index(["strategy", "candidate"])["score"]
+    assert scores["mean", "A"] == pytest.approx(7.0)
+    assert scores["mean", "B"] == pytest.approx(6.6)
+    assert scores["median", "B"] == pytest.approx(8.0)
+
+
+def test_trimmed_mean_drops_the_extreme_judges(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    judge_scores = get_judge_scores(build_responses_df(SCORES))
+    scores = trimmed_mean_of_judge_means(judge_scores, proportion=0.2)
+    assert scores["A"] == pytest.approx(7.0)
+    assert scores["B"] == pytest.approx(8.0)
+
+
+def test_rank_candidates_ties_share_a_rank(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    responses_df = build_responses_df(
+        {("Judge 1", "A"): [5.0], ("Judge 1", "B"): [5.0], ("Judge 1", "C"): [2.0]}
+    )
+    ranking = rank_candidates(responses_df, ["mean"])
+    assert ranking["rank"].tolist() == [1, 1, 3]
+
+
+def test_rank_candidates_rejects_unknown_strategies(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    with pytest.raises(ValueError, match="unknown ranking strategies"):
+        rank_candidates(build_responses_df(SCORES), ["best"])
+
+
+def test_rank_candidates_by_form_ranks_each_form_apart(
+    build_responses_df: Callable[[dict], pd.DataFrame],
+) -> None:
+    other_scores = {
+        (judge, "A"): [10.0 - values[0]] for (judge, _), values in SCORES.items()
+    }
+    forms = {
+        "form1": build_responses_df(SCORES),
+        "form2": build_responses_df(other_scores),
+    }
+    responses_df = pd.concat(
+        [df.assign(formId=formId) for formId, df in forms.items()], ignore_index=True
+    )
+    ranking = rank_candidates(responses_df, ["mean", "zscore"], by=["formId"])
+    for formId, df in forms.items():
+        form_ranking = ranking[ranking["formId"] == formId].drop(columns="formId")
+        pd.testing.assert_frame_equal(
+            form_ranking.reset_index(drop=True),
+            rank_candidates(df, ["mean", "zscore"]),
+            check_dtype=False,
+        )
@@ -0,0 +1,107 @@
+from typing import Any
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from request_executor import Request_executor, Token_bucket, is_retryable
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Request:
+    """
+    stands for an HttpRequest, raises the errors in order and then returns
+    the result
+    """
+
+    def __init__(self, errors: list, method: str = "GET") -> None:
+        self.errors = list(errors)
+        self.method = method
+        self.methodId = "forms.get"
+        self.uri = "https://forms.googleapis.com/v1/forms/form1"
+        self.postproc = lambda response, content: content
+        self.calls = 0
+
+    def execute(self, num_retries: int = 0) -> Any:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"formId": "form1"}
+
+
+def _http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+
+def test_token_bucket_lets_a_burst_through_then_waits() -> None:
+    clock = _Clock()
+    token_bucket = Token_bucket(60, capacity=2, clock=clock, sleep=clock.sleep)
+    assert token_bucket.acquire() == 0
+    assert token_bucket.acquire() == 0
+    assert token_bucket.acquire() == pytest.approx(1.0)
+    clock.now += 10
+    # the bucket refills up to its capacity only
+    assert token_bucket.acquire(2) == 0
+    assert token_bucket.acquire() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize(
+    "error, method, retryable",
+    [
+        (_http_error(429), "POST", True),
+        (_http_error(503), "GET", True),
+        (_http_error(503), "POST", False),
+        (_http_error(400), "GET", False),
+        (ConnectionError(), "GET", True),
+        (ValueError(), "GET", False),
+    ],
+)
+def test_is_retryable(error: Exception, method: str, retryable: bool) -> None:
+    assert is_retryable(error, method) is retryable
+
+
+def test_execute_retries_with_backoff() -> None:
+    sleeps: list[float] = []
+    executor = Request_executor(
+        "forms", 6000, max_retries=3, base_delay=1, max_delay=8, sleep=sleeps.append
+    )
+    request = _Request([_http_error(429), _http_error(503)])
+    assert executor.execute(request) == {"formId": "form1"}  # type: ignore[arg-type]
+    assert request.calls == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+
+def test_execute_gives_up_after_max_retries() -> None:
+    sleeps: list[float] = []
+    executor = Request_executor("forms", 6000, max_retries=2, sleep=sleeps.append)
+    request = _Request([_http_error(500)] * 5)
+    with pytest.raises(HttpError):
+        executor.execute(request)  # type: ignore[arg-type]
+    assert request.calls == 3
+
+
+def test_execute_does_not_retry_a_client_error() -> None:
+    executor = Request_executor("forms", 6000, sleep=lambda seconds: None)
+    request = _Request([_http_error(404)])
+    with pytest.raises(HttpError):
+        executor.execute(request)  # type: ignore[arg-type]
+    assert request.calls == 1
+
+
+def test_backoff_delay_follows_retry_after() -> None:
+    executor = Request_executor("forms", 6000, max_delay=30)
+    error = HttpError(httplib2.Response({"status": 429, "retry-after": "7"}), b"")
+    assert executor.get_backoff_delay(0, error) == 7
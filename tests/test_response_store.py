@@ -0,0 +1,46 @@
+from fake_google import generate_form
+from response_store import Response_store
+
+
+def test_store_keeps_the_form_and_its_responses(store: Response_store) -> None:
+    form, responses = generate_form("form1", "Award 1", 3, 2)
+    store.save_form(form)
+    last_submitted_time = store.save_responses("form1", responses)
+    assert last_submitted_time == max(
+        response["lastSubmittedTime"] for response in responses
+    )
+    assert store.get_form("form1") == form
+    assert store.get_responses("form1") == responses
+    assert store.count_responses("form1") == 3
+    assert store.list_forms() == [{"id": "form1", "name": "Award 1"}]
+
+
+def test_store_moves_the_last_submitted_time_only_when_saved(
+    store: Response_store,
+) -> None:
+    form, responses = generate_form("form1", "Award 1", 3, 2)
+    store.save_form(form)
+    last_submitted_time = store.save_responses("form1", responses)
+    assert store.get_last_submitted_time("form1") is None
+    store.save_last_submitted_time("form1", last_submitted_time)
+    assert store.get_last_submitted_time("form1") == last_submitted_time
+    store.clear_responses("form1")
+    assert store.get_last_submitted_time("form1") is None
+    assert store.count_responses("form1") == 0
+
+
+def test_store_replaces_an_edited_response(store: Response_store) -> None:
+    form, responses = generate_form("form1", "Award 1", 2, 2)
+    store.save_form(form)
+    store.save_responses("form1", responses)
+    edited = {**responses[0], "lastSubmittedTime": "2030-01-01T00:00:00Z"}
+    assert store.save_responses("form1", [edited]) == "2030-01-01T00:00:00Z"
+    assert store.count_responses("form1") == 2
+    assert edited in store.get_responses("form1")
+
+
+def test_store_page_tokens(store: Response_store) -> None:
+    assert store.get_page_token("changes") is None
+    store.save_page_token("changes", "1")
+    store.save_page_token("changes", "2")
+    assert store.get_page_token("changes") == "2"
@@ -0,0 +1,31 @@
+import json
+
+from utils import chunk_requests
+
+
+def _request(size: int) -> dict:
+    return {"createItem": {"item": {"title": "x" * size}}}
+
+
+def test_chunk_requests_by_number_of_requests() -> None:
+    requests = [_request(index) for index in range(7)]
+    chunks = chunk_requests(requests, max_requests=3)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [request for chunk in chunks for request in chunk] == requests
+
+
+def test_chunk_requests_by_bytes() -> None:
+    requests = [_request(100) for _ in range(5)]
+    request_bytes = len(json.dumps(requests[0]))
+    chunks = chunk_requests(requests, max_requests=50, max_bytes=2 * request_bytes)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_chunk_requests_oversized_request_gets_its_own_chunk() -> None:
+    requests = [_request(1), _request(1000), _request(1)]
+    chunks = chunk_requests(requests, max_requests=50, max_bytes=200)
+    assert chunks == [[requests[0]], [requests[1]], [requests[2]]]
+
+
+def test_chunk_requests_empty() -> None:
+    assert chunk_requests([]) == []
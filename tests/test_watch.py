@@ -0,0 +1,73 @@
+import json
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+
+import pytest
+
+from fake_google import Fake_google, generate_form
+from response_store import Response_store
+from watch import Form_watcher, Leaderboard, Poll_interval, serve_leaderboard
+
+
+def test_poll_interval_backs_off_while_idle() -> None:
+    poll_interval = Poll_interval(1, 5)
+    assert [poll_interval.update(False) for _ in range(4)] == [2, 4, 5, 5]
+    assert poll_interval.update(True) == 1
+
+
+def test_watcher_fetches_only_the_changed_forms(
+    fake: Fake_google, store: Response_store
+) -> None:
+    watcher = Form_watcher({}, handler_kwargs={"store": store})
+    assert watcher.poll() == 2
+    assert set(watcher.forms) == {"form0000", "form0001"}
+    fake.reset_calls()
+
+    assert watcher.poll() == 0
+    assert fake.reset_calls() == {"http": 1, "drive.changes.list": 1}
+
+    _, responses = generate_form("form0001", "Award 0001", 1, 3, seed=9)
+    responses[0]["responseId"] += "-new"
+    responses[0]["lastSubmittedTime"] = "2030-01-01T00:00:00Z"
+    responses[0]["answers"]["judge"]["textAnswers"]["answers"][0]["value"] = "Judge 100"
+    fake.add_responses("form0001", responses)
+    assert watcher.poll() == 1
+    calls = fake.reset_calls()
+    assert calls["forms.get"] == calls["forms.responses.list"] == 1
+    body, _ = watcher.leaderboard.get("/rankings/form0001") or (b"", "")
+    assert len(json.loads(body)["completion"]["per_judge"]) == 5
+
+
+@pytest.fixture
+def leaderboard_url() -> Iterator[tuple[Leaderboard, str]]:
+    leaderboard = Leaderboard()
+    server = serve_leaderboard(leaderboard, "127.0.0.1", 0)
+    yield leaderboard, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url: str, etag: str = "") -> tuple[int, str, bytes]:
+    request = urllib.request.Request(url, headers={"If-None-Match": etag})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers["ETag"], response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers.get("ETag", ""), b""
+
+
+def test_leaderboard_is_served_with_etags(
+    leaderboard_url: tuple[Leaderboard, str],
+) -> None:
+    leaderboard, url = leaderboard_url
+    leaderboard.update({"form1": {"formId": "form1", "title": "Award 1"}})
+    status, etag, body = _get(f"{url}/rankings")
+    assert status == 200
+    assert [form["formId"] for form in json.loads(body)["forms"]] == ["form1"]
+    assert _get(f"{url}/rankings", etag)[0] == 304
+    assert _get(f"{url}/rankings/form1")[0] == 200
+    assert _get(f"{url}/rankings/form2")[0] == 404
+
+    leaderboard.update({"form1": {"formId": "form1", "title": "Award 1 edited"}})
+    assert _get(f"{url}/rankings", etag)[0] == 200
@@ -1,7 +1,18 @@
 from enum import Enum
 
+import json
+
 import pandas as pd
 
+from settings import BATCH_UPDATE_MAX_BYTES, BATCH_UPDATE_MAX_REQUESTS
+
+# the columns of the responses dataframe that are not scores
+INFO_COLUMNS = ["candidate", "Judge Name", "Affiliation"]
+# the scores go from 1 to 10, float32 holds them and NaN for a missing score
+SCORE_DTYPE = "float32"
+# the columns of the nominations sheet the nominees are grouped by
+GROUP_COLUMNS = ["Individual/Project/Alumni", "For Individual Nominations only"]
+
 
 class Award(Enum):
     INDIVIDUAL_APPLICATIONS = (3, 4, "Individual")
@@ -23,24 +34,77 @@ class Form_Type(Enum):
 
 
 def convert_sheet_data_to_df(sheet_data: dict) -> pd.DataFrame:
+    """
+    turns a value range of the sheets api, with the header in its first row,
+    into a dataframe of stripped strings. The api leaves out the trailing
+    empty cells of a row, short rows are padded with "" and the cells past
+    the header are dropped
+    """
     values = sheet_data.get("values", [])
-    values = [
-        [inner_item.strip() for inner_item in outer_item] for outer_item in values
-    ]
-    df = pd.DataFrame(values[1:], columns=values[0])
+    if not values:
+        return pd.DataFrame()
+    header = [str(column).strip() for column in values[0]]
+    df = pd.DataFrame(values[1:], dtype=object)
+    df = df.reindex(columns=range(len(header))).fillna("")
+    df.columns = pd.Index(header)
+    for column in df.columns:
+        df[column] = df[column].astype(str).str.strip()
     return df
 
 
-def process_df(df: pd.DataFrame) -> pd.core.groupby.DataFrameGroupBy:
-    project_alumni_filter = df["Individual/Project/Alumni"].isin(
-        ["Alumni Association", "Project"]
-    )
-    df.loc[project_alumni_filter, "For Individual Nominations only"] = df[
-        "Individual/Project/Alumni"
+def convert_value_ranges_to_df(value_ranges: list) -> pd.DataFrame:
+    """
+    concatenates the value ranges of a batchGet, see convert_sheet_data_to_df
+    """
+    dataframes = [convert_sheet_data_to_df(value_range) for value_range in value_ranges]
+    if not dataframes:
+        return pd.DataFrame()
+    return pd.concat(dataframes, ignore_index=True).fillna("")
+
+
+def get_score_columns(df: pd.DataFrame) -> list:
+    """
+    returns the score columns of a responses dataframe, the numeric columns
+    that are not INFO_COLUMNS. The answers of text and choice questions stay
+    categorical and are not scores
+    """
+    return [
+        column
+        for column in df.columns
+        if column not in INFO_COLUMNS and pd.api.types.is_numeric_dtype(df[column])
     ]
-    groupdf = df.groupby(
-        ["Individual/Project/Alumni", "For Individual Nominations only"]
+
+
+def compact_responses_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    returns df with SCORE_DTYPE score columns and categorical other columns.
+    pd.concat turns categoricals with different categories back into object
+    columns, the responses of several pages or forms are compacted again
+    after being concatenated
+    """
+    score_columns = set(get_score_columns(df))
+    return df.astype(
+        {
+            column: SCORE_DTYPE if column in score_columns else "category"
+            for column in df.columns
+        }
     )
+
+
+def process_df(df: pd.DataFrame) -> pd.core.groupby.DataFrameGroupBy:
+    """
+    groups the nominees by GROUP_COLUMNS, the projects and alumni
+    associations are their own category. The group columns are categorical
+    so the groups are found from their codes rather than by comparing
+    strings, and df itself is left unchanged
+    """
+    award_type, category = GROUP_COLUMNS
+    project_alumni_filter = df[award_type].isin(["Alumni Association", "Project"])
+    df = df.assign(
+        **{category: df[category].mask(project_alumni_filter, df[award_type])}
+    )
+    df = df.astype({column: "category" for column in GROUP_COLUMNS})
+    groupdf = df.groupby(GROUP_COLUMNS, observed=True, sort=False)
     return groupdf
 
 
@@ -93,6 +157,43 @@ def build_requests_list(list_of_requests: list) -> dict:
     return requests_list
 
 
+def build_json_for_form_title(form_title: str) -> dict:
+    UPDATE_FORM_TITLE = {
+        "updateFormInfo": {
+            "info": {"title": form_title},
+            "updateMask": "title",
+        }
+    }
+    return UPDATE_FORM_TITLE
+
+
+def chunk_requests(
+    list_of_requests: list,
+    max_requests: int = BATCH_UPDATE_MAX_REQUESTS,
+    max_bytes: int = BATCH_UPDATE_MAX_BYTES,
+) -> list[list]:
+    """
+    splits the requests of a batchUpdate into chunks of at most max_requests
+    requests and about max_bytes of json each, keeping their order. A request
+    bigger than max_bytes gets a chunk of its own
+    """
+    chunks: list[list] = []
+    chunk: list = []
+    chunk_bytes = 0
+    for request in list_of_requests:
+        request_bytes = len(json.dumps(request))
+        if chunk and (
+            len(chunk) >= max_requests or chunk_bytes + request_bytes > max_bytes
+        ):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(request)
+        chunk_bytes += request_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
 def convert_form_type_enum_to_award_enum(form_title: Enum) -> Enum:
     if form_title == Form_Type.PROJECT:
         return Award.COLLABORATIVE_PROJECTS
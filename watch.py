@@ -0,0 +1,270 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import unquote, urlsplit
+
+from log import logger
+from metrics import metrics
+from pool import run_in_pool
+from service_template import Drive_service, Form_handler, client_registry
+from settings import WATCH_HOST, WATCH_MAX_INTERVAL, WATCH_MIN_INTERVAL, WATCH_PORT
+
+
+class Poll_interval:
+    """
+    seconds to wait before the next poll, back to minimum as soon as a poll
+    finds changes and multiplied by factor after each idle poll, up to maximum
+
+    input: minimum, maximum, factor
+    """
+
+    def __init__(
+        self,
+        minimum: float = WATCH_MIN_INTERVAL,
+        maximum: float = WATCH_MAX_INTERVAL,
+        factor: float = 2.0,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.factor = factor
+        self.seconds = minimum
+
+    def update(self, changed: bool) -> float:
+        if changed:
+            self.seconds = self.minimum
+        else:
+            self.seconds = min(self.maximum, self.seconds * self.factor)
+        return self.seconds
+
+
+class Leaderboard:
+    """
+    the json documents served by the watch endpoint with their ETags. They
+    are rendered once per update, a request only looks one up, so serving
+    the rankings costs no api call and no pandas work
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._documents: dict[str, tuple[bytes, str]] = {}
+        self.update({})
+
+    def update(self, forms: dict) -> None:
+        """
+        renders /rankings with every form and /rankings/<formId> for each
+        form of forms, {formId: entry} as built by Form_watcher
+        """
+        documents = {
+            "/rankings": self.__render(
+                {
+                    "updated": datetime.now(timezone.utc).isoformat(),
+                    "forms": sorted(forms.values(), key=lambda form: form["title"]),
+                }
+            )
+        }
+        for formId, form in forms.items():
+            documents[f"/rankings/{formId}"] = self.__render(form)
+        with self._lock:
+            self._documents = documents
+
+    def get(self, path: str) -> Optional[tuple[bytes, str]]:
+        with self._lock:
+            return self._documents.get(path)
+
+    @staticmethod
+    def __render(document: dict) -> tuple[bytes, str]:
+        body = json.dumps(document).encode("utf-8")
+        return body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class _Leaderboard_request_handler(BaseHTTPRequestHandler):
+    leaderboard: Leaderboard
+
+    def do_GET(self) -> None:
+        path = unquote(urlsplit(self.path).path).rstrip("/") or "/rankings"
+        document = self.leaderboard.get(path)
+        if document is None:
+            self.send_error(404, f"no document at [{path}], see /rankings")
+            return
+        body, etag = document
+        if_none_match = self.headers.get("If-None-Match", "")
+        if if_none_match.strip() == "*" or etag in [
+            tag.strip() for tag in if_none_match.split(",")
+        ]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        # browsers keep the document but ask with its ETag on every refresh
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"[{self.address_string()}] {format % args}")
+
+
+def serve_leaderboard(
+    leaderboard: Leaderboard, host: str = WATCH_HOST, port: int = WATCH_PORT
+) -> ThreadingHTTPServer:
+    """
+    serves leaderboard from a background thread, port 0 picks a free port,
+    see server.server_port. Stop it with server.shutdown()
+    """
+    handler_class = type(
+        "Leaderboard_request_handler",
+        (_Leaderboard_request_handler,),
+        {"leaderboard": leaderboard},
+    )
+    server = ThreadingHTTPServer((host, port), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Form_watcher:
+    """
+    keeps a Form_handler per form and polls the drive changes for the forms
+    that were edited or received responses. Only those are fetched again,
+    with their new responses only, and only their ranking and completion
+    rates are computed again before the leaderboard is updated
+
+    input: form_filters, workers, handler_kwargs, leaderboard, poll_interval
+    """
+
+    def __init__(
+        self,
+        form_filters: dict,
+        workers: int = 1,
+        handler_kwargs: Optional[dict] = None,
+        leaderboard: Optional[Leaderboard] = None,
+        poll_interval: Optional[Poll_interval] = None,
+    ) -> None:
+        self.form_filters = form_filters
+        self.workers = workers
+        # the responses already fetched are in the store, a poll only asks
+        # the api for the new ones
+        self.handler_kwargs = {**(handler_kwargs or {}), "incremental": True}
+        self.leaderboard = leaderboard if leaderboard is not None else Leaderboard()
+        self.poll_interval = (
+            poll_interval if poll_interval is not None else Poll_interval()
+        )
+        self.handlers: dict[str, Form_handler] = {}
+        self.forms: dict[str, dict] = {}
+        self._page_token: Optional[str] = None
+        self._failed_forms_ids: list = []
+
+    def get_changed_forms_ids(self) -> list:
+        """
+        returns all the forms matching the filters on the first poll, then
+        the forms drive reports as changed since the previous poll
+        """
+        drive_service_instance = client_registry.get(Drive_service)
+        if self._page_token is None:
+            self._page_token = drive_service_instance.get_start_page_token()
+            return drive_service_instance.get_list_of_forms_ids(
+                refresh=True, **self.form_filters
+            )
+        forms_ids, self._page_token = drive_service_instance.list_changed_forms(
+            self._page_token, **self.form_filters
+        )
+        return forms_ids
+
+    def poll(self) -> int:
+        """
+        updates the forms changed since the previous poll, and the ones that
+        failed in it, and returns the number of forms updated
+
+        input: none
+        attributes used: self.forms, self.handlers, self.leaderboard, self.workers
+        methods used: self.get_changed_forms_ids(), Form_handler.prefetch(),
+            self.__update_form()
+        output: int
+        """
+        forms_ids = list(
+            dict.fromkeys([*self._failed_forms_ids, *self.get_changed_forms_ids()])
+        )
+        if not forms_ids:
+            return 0
+        for formId in forms_ids:
+            if formId in self.handlers:
+                self.handlers[formId].invalidate()
+            else:
+                self.handlers[formId] = Form_handler(
+                    formId=formId, **self.handler_kwargs
+                )
+        # the changed forms are fetched together in batch calls, the workers
+        # then only fetch their responses
+        with metrics.stage("fetch_form"):
+            Form_handler.prefetch([self.handlers[formId] for formId in forms_ids])
+        entries, errors = run_in_pool(
+            forms_ids, self.__update_form, self.workers, "form"
+        )
+        self._failed_forms_ids = list(errors)
+        if entries:
+            self.forms.update(entries)
+            self.leaderboard.update(self.forms)
+        return len(entries)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """
+        polls until stop is set, waiting self.poll_interval between polls. A
+        failed poll, such as a network error, counts as an idle one
+        """
+        stop = stop if stop is not None else threading.Event()
+        while not stop.is_set():
+            try:
+                updated = self.poll()
+            except Exception as error:
+                logger.exception(f"poll failed: {error}")
+                updated = 0
+            interval = self.poll_interval.update(updated > 0)
+            logger.info(f"[{updated}] forms updated, next poll in [{interval:.0f}]s")
+            stop.wait(interval)
+
+    def __update_form(self, formId: str) -> dict:
+        handler = self.handlers[formId]
+        ranking = handler.get_candidates_ranking()
+        completion = handler.get_completion_report()
+        # one row per missing score, too long for a leaderboard
+        completion.pop("missing", None)
+        return {
+            "formId": formId,
+            "title": handler.form_type,
+            "form_url": handler.form_url,
+            "updated": datetime.now(timezone.utc).isoformat(),
+            "ranking": json.loads(ranking.to_json(orient="records")),
+            "completion": completion,
+        }
+
+
+def watch(
+    form_filters: dict,
+    workers: int = 1,
+    handler_kwargs: Optional[dict] = None,
+    host: str = WATCH_HOST,
+    port: int = WATCH_PORT,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    serves the rankings and completion rates of the forms on
+    http://host:port/rankings and keeps them up to date until stop is set or
+    the process is interrupted, see Form_watcher
+    """
+    watcher = Form_watcher(form_filters, workers, handler_kwargs)
+    server = serve_leaderboard(watcher.leaderboard, host, port)
+    logger.info(f"serving the rankings on http://{host}:{server.server_port}/rankings")
+    try:
+        watcher.run(stop)
+    except KeyboardInterrupt:
+        logger.info("stopped watching the forms")
+    finally:
+        server.shutdown()
+        server.server_close()